@@ -8,6 +8,9 @@ load_dotenv()
 # Important: set GOOGLE_API_KEY in backend/.env or in your environment BEFORE running
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", None)
 USE_DUMMY = os.environ.get("USE_DUMMY_PROVIDER", "false").lower() in ("1", "true", "yes")
+# Optional override of the Gemini API host, e.g. http://127.0.0.1:9000 for the local
+# stand-in server in loadtest/stub_provider.py
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT", None)
 
 # We'll create simple wrappers that try to use Google Generative AI (Gemini) via the
 # official google.generativeai package when available. If not installed or key missing,
@@ -25,13 +28,20 @@ class LLMProvider:
         raise NotImplementedError
 
 
+class ProviderError(Exception):
+    """Raised when the upstream model provider call fails (surfaced as 502)."""
+
+
 # Try to load google generative ai if user requested Gemini
 if not USE_DUMMY:
     try:
         import google.generativeai as genai  # pip install google-generativeai
         if not GOOGLE_API_KEY:
             raise RuntimeError("GOOGLE_API_KEY not set in env; set it before running.")
-        genai.configure(api_key=GOOGLE_API_KEY)
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=GOOGLE_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=GOOGLE_API_KEY)
 
         class GeminiEmbeddings(EmbeddingsProvider):
             def __init__(self, model_name: str = "models/text-embedding-004"):
@@ -63,7 +73,7 @@ if not USE_DUMMY:
                     return response.text
                 except Exception as e:
                     print(f"Error generating response: {e}")
-                    return "I encountered an error generating a response."
+                    raise ProviderError(f"Gemini generate failed: {e}") from e
 
         EMB_PROVIDER: EmbeddingsProvider = GeminiEmbeddings()
         LLM_PROVIDER: LLMProvider = GeminiLLM()
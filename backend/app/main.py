@@ -1,12 +1,16 @@
 # backend/app/main.py
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import os;
-from app.models.schemas import IngestResponse, QueryRequest, QueryResponse
-from app.services import transcript, sessions, rag
-from app.deps import EMB_PROVIDER, LLM_PROVIDER
+from app.models.schemas import IngestResponse, QueryRequest, QueryResponse, PrefetchResponse, BundleImportRequest, BundleImportResponse, ProfilingToggleRequest
+from app.services import transcript, sessions, rag, prefetch, memory, bundles, profiling
+from app.deps import EMB_PROVIDER, LLM_PROVIDER, ProviderError
 
 app = FastAPI(title="VidSage Backend", version="0.1.0")
 
@@ -23,41 +27,161 @@ logger = logging.getLogger("uvicorn")
 logger.setLevel(logging.INFO)
 
 
+@app.on_event("startup")
+async def _configure_threadpool():
+    # Sync endpoints run on anyio's worker threads (40 by default); tunable for load tests
+    size = os.environ.get("THREADPOOL_SIZE")
+    if size:
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(size)
+
+
+@app.on_event("startup")
+def _load_bundles():
+    # Indexes built offline by build_bundles.py; mapped, not copied, into memory
+    root = os.environ.get("INDEX_BUNDLE_DIR")
+    if root and os.path.isdir(root):
+        loaded = bundles.load_bundle_dir(root, EMB_PROVIDER, rag.INDEXES)
+        for video_id in loaded:
+            memory.touch(video_id)
+        logger.info("Loaded %d videos from bundles in %s", len(loaded), root)
+
+
+def _fetch_text(video_id: str) -> str:
+    return transcript.fetch_transcript_text(video_id, languages=["en"])
+
+
+def _build_index(video_id: str, text: str, indexes: dict, speculative: bool = False, cancel_check=None) -> int:
+    # Speculative (prefetch) builds only use free budget, never evict other videos, and
+    # give their reservation back (by being cancelled) when an interactive ingest needs it
+    with profiling.stage("admission"):
+        token = memory.reserve(video_id, memory.estimate_text(text), rag.INDEXES, sessions.get_all_sessions(),
+                               evict=not speculative, speculative=speculative)
+    try:
+        return rag.ingest_video_to_index(video_id, text, EMB_PROVIDER, indexes, cancel_check=cancel_check)
+    finally:
+        memory.release(token)
+
+
+def _require_admin(x_admin_token: Optional[str]) -> None:
+    # Admin routes are disabled unless ADMIN_TOKEN is configured
+    token = os.environ.get("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != token:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _profile_mode(x_profile: Optional[str], x_admin_token: Optional[str]) -> Optional[str]:
+    # ignored when admin is off: a 404 here would read as "video not ingested"
+    if not x_profile or not os.environ.get("ADMIN_TOKEN"):
+        return None
+    _require_admin(x_admin_token)
+    mode = "sample" if x_profile.lower() in ("1", "true", "yes") else x_profile.lower()
+    if mode not in profiling.MODES:
+        raise HTTPException(status_code=400, detail=f"X-Profile must be one of {profiling.MODES}")
+    return mode
+
+
+@contextmanager
+def _traced(endpoint: str, video_id: str, response: Response, x_profile: Optional[str], x_admin_token: Optional[str]):
+    # Failed requests keep their X-Profile-Id too (headers set on `response` are dropped
+    # when the endpoint raises). Unhandled errors become a bare 500: list /admin/profiles.
+    with profiling.request_trace(endpoint, video_id, _profile_mode(x_profile, x_admin_token)) as trace:
+        if trace["profile_id"]:
+            response.headers["X-Profile-Id"] = trace["profile_id"]
+        try:
+            yield
+        except HTTPException as e:
+            if trace["profile_id"]:
+                e.headers = {**(e.headers or {}), "X-Profile-Id": trace["profile_id"]}
+            raise
+
+
 @app.post("/ingest/{video_id}", response_model=IngestResponse)
-def ingest_video(video_id: str):
+def ingest_video(video_id: str, response: Response, x_profile: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
     """
     Ingest a video: fetch its transcript, split, embed and index.
     Idempotent: re-running will overwrite the in-memory index for that video.
+    If a prefetch for this video is running or finished, its index is reused instead.
+    Send X-Profile: sample|cprofile to profile this request (see /admin/profiles).
     """
-    try:
-        text = transcript.fetch_transcript_text(video_id, languages=["en"])
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Could not fetch transcript: {e}")
+    with _traced("ingest", video_id, response, x_profile, x_admin_token):
+        return _ingest(video_id)
 
-    try:
-        num_chunks = rag.ingest_video_to_index(video_id, text, EMB_PROVIDER, rag.INDEXES)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Indexing error: {e}")
 
+def _ingest(video_id: str) -> IngestResponse:
+    with profiling.stage("prefetch_claim"):
+        prefetched = prefetch.claim(video_id, rag.INDEXES)
+    if prefetched is not None:
+        memory.touch(video_id)
+        return IngestResponse(status="ok", video_id=video_id, chunks=prefetched)
+
+    with prefetch.interactive():
+        try:
+            with profiling.stage("transcript"):
+                text = _fetch_text(video_id)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Could not fetch transcript: {e}")
+
+        try:
+            num_chunks = _build_index(video_id, text, rag.INDEXES)
+        except memory.MemoryBudgetExceeded as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Indexing error: {e}")
+
+    memory.touch(video_id)
     return IngestResponse(status="ok", video_id=video_id, chunks=num_chunks)
 
 
+@app.post("/prefetch/{video_id}", response_model=PrefetchResponse, status_code=202)
+def prefetch_video(video_id: str):
+    """
+    Speculatively ingest a video in the background (called when a video page loads).
+    Deduplicated per video and run below interactive requests; /ingest picks up the result.
+    """
+    state = prefetch.schedule(video_id, _fetch_text, partial(_build_index, speculative=True), rag.INDEXES)
+    return PrefetchResponse(video_id=video_id, state=state)
+
+
+@app.delete("/prefetch/{video_id}", response_model=PrefetchResponse)
+def cancel_prefetch(video_id: str):
+    """
+    Withdraw interest in a prefetch (the tab moved on). Cancels the job once nobody else wants it.
+    """
+    prefetch.cancel(video_id)
+    state = prefetch.status(video_id) or ("done" if video_id in rag.INDEXES else "cancelled")
+    return PrefetchResponse(video_id=video_id, state=state)
+
+
 @app.post("/query", response_model=QueryResponse)
-def query(req: QueryRequest):
+def query(req: QueryRequest, response: Response, x_profile: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
     """
     Query the ingested video. Must have ingested the video first.
     session_id is used to keep conversational context.
+    Send X-Profile: sample|cprofile to profile this request (see /admin/profiles).
     """
+    with _traced("query", req.video_id, response, x_profile, x_admin_token):
+        return _query(req)
+
+
+def _query(req: QueryRequest) -> QueryResponse:
     if req.video_id not in rag.INDEXES:
         raise HTTPException(status_code=404, detail="Video not ingested. Call /ingest/{video_id} first.")
 
+    memory.touch(req.video_id)
+
     # Retrieve session history & append question
     history = sessions.get_history(req.session_id)
 
     try:
-        answer, snippets = rag.answer_question(req.video_id, history, req.question, EMB_PROVIDER, LLM_PROVIDER, rag.INDEXES)
+        with prefetch.interactive():
+            answer, snippets = rag.answer_question(req.video_id, history, req.question, EMB_PROVIDER, LLM_PROVIDER, rag.INDEXES)
     except KeyError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ProviderError as e:
+        raise HTTPException(status_code=502, detail=f"LLM provider error: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error answering question: {e}")
 
@@ -68,6 +192,80 @@ def query(req: QueryRequest):
     return QueryResponse(answer=answer, source_chunks=snippets)
 
 
+@app.get("/admin/memory")
+def admin_memory(x_admin_token: Optional[str] = Header(None)):
+    """
+    Estimated memory held by indexes (largest first) and sessions, against the global budget.
+    """
+    _require_admin(x_admin_token)
+    indexes = memory.index_stats(rag.INDEXES)
+    session_info = memory.session_stats(sessions.get_all_sessions())
+    return {
+        "budget_bytes": memory.MEMORY_BUDGET_BYTES,
+        "used_bytes": sum(i["bytes"] for i in indexes) + session_info["bytes"],
+        "rss_bytes": memory.current_rss_bytes(),
+        "indexes": indexes,
+        "sessions": session_info,
+    }
+
+
+@app.post("/admin/bundles", response_model=BundleImportResponse)
+def import_bundle(req: BundleImportRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load an offline-built index bundle into memory (zero-copy via mmap).
+    Bundles built with a different embedding model are refused with 409.
+    """
+    _require_admin(x_admin_token)
+    try:
+        videos = bundles.load_bundle(req.path, EMB_PROVIDER, rag.INDEXES)
+        for video_id in videos:
+            memory.touch(video_id)
+    except bundles.BundleModelMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except bundles.BundleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BundleImportResponse(status="ok", videos=videos)
+
+
+@app.get("/admin/traces")
+def admin_traces(x_admin_token: Optional[str] = Header(None)):
+    """
+    The slowest recent requests, slowest first, with per-stage timings.
+    """
+    _require_admin(x_admin_token)
+    return {"traces": profiling.slowest_traces()}
+
+
+@app.post("/admin/profiling")
+def admin_profiling(req: ProfilingToggleRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Profile the next `count` requests (optionally only for one video). mode=null disables.
+    """
+    _require_admin(x_admin_token)
+    try:
+        return profiling.configure(req.mode, req.video_id, req.count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/profiles")
+def admin_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+def admin_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    A stored profile: collapsed stacks (feed to flamegraph.pl or speedscope) or pstats text.
+    """
+    _require_admin(x_admin_token)
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have rolled out of the buffer)")
+    return PlainTextResponse(profile["output"])
+
+
 @app.get("/health")
 def health():
     return {"status": "ok", "provider_dummy": getattr(EMB_PROVIDER, "__class__", None).__name__}
@@ -76,4 +274,7 @@ def health():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     # for deployment on cloud environment.
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, log_level="info")
+    # Indexes and sessions are per process: with several workers a video must be ingested
+    # on every worker (or requests routed stickily by video), otherwise /query returns 404.
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, log_level="info", workers=workers)
@@ -18,3 +18,23 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
     source_chunks: Optional[list] = Field(None, description="Optional list of context snippets used")
+
+
+class PrefetchResponse(BaseModel):
+    video_id: str
+    state: str = Field(..., description="Prefetch job state: queued, running, done or cancelled")
+
+
+class BundleImportRequest(BaseModel):
+    path: str = Field(..., description="Bundle directory on the server's filesystem")
+
+
+class BundleImportResponse(BaseModel):
+    status: str
+    videos: list = Field(default_factory=list, description="Video ids loaded from the bundle")
+
+
+class ProfilingToggleRequest(BaseModel):
+    mode: Optional[str] = Field("sample", description="sample, cprofile, or null to disable")
+    video_id: Optional[str] = Field(None, description="Only profile requests for this video")
+    count: int = Field(1, ge=1, description="Number of upcoming requests to profile")
@@ -0,0 +1,277 @@
+# backend/app/services/bundles.py
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+import json
+import math
+import os
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Portable index bundles, built offline (see build_bundles.py) and memory-mapped at import.
+#
+# A bundle is a directory holding one or more videos (a shard):
+#   manifest.json   format/version, embedding model + dimension, per-video row ranges
+#   vectors.f32     float32 [count, dim], row-major, little-endian, contiguous
+#   chunks.off      uint64 [count + 1] byte offsets of each chunk in chunks.txt
+#   chunks.txt      UTF-8 chunk text, concatenated
+#   timestamps.f32  float32 [count] chunk start time in seconds (NaN when unknown)
+
+BUNDLE_FORMAT = "vidsage-index-bundle"
+BUNDLE_VERSION = 1
+
+VECTORS_FILE = "vectors.f32"
+OFFSETS_FILE = "chunks.off"
+TEXT_FILE = "chunks.txt"
+TIMESTAMPS_FILE = "timestamps.f32"
+MANIFEST_FILE = "manifest.json"
+
+
+class BundleError(ValueError):
+    """Raised for unreadable or malformed bundles."""
+
+
+class BundleModelMismatch(BundleError):
+    """Raised when a bundle was built with a different embedding model than the server uses."""
+
+
+PROBE_TEXT = "vidsage bundle dimension probe"
+
+
+def provider_model_name(provider: Any) -> str:
+    """
+    Name recorded in / checked against bundle manifests for an embeddings provider.
+    Providers without an explicit model_name (e.g. the per-process TF-IDF dummy) do not
+    produce portable embeddings and are refused.
+    """
+    name = getattr(provider, "model_name", None)
+    if not name:
+        raise BundleModelMismatch(f"Embeddings provider {type(provider).__name__} has no model_name; its vectors are not portable across processes")
+    return name
+
+
+def _check_provider(manifest: dict, path: str, embeddings_provider: Any, adapter: Any) -> None:
+    expected = provider_model_name(embeddings_provider)
+    if manifest["model"] != expected:
+        raise BundleModelMismatch(f"Bundle {path} was built with embedding model {manifest['model']!r}, this server uses {expected!r}")
+    # a matching name is not enough (renamed or reconfigured models); compare real dimensions.
+    # The probe is cached on the adapter, so a directory of bundles costs one provider call.
+    try:
+        dim = adapter.dimension(PROBE_TEXT)
+    except Exception as e:
+        raise BundleError(f"Could not embed a probe to check bundle {path}: {e}")
+    if dim != manifest["dim"]:
+        raise BundleModelMismatch(f"Bundle {path} has dimension {manifest['dim']}, this server's embeddings have {dim}")
+
+
+def export_faiss(index: Any) -> Tuple[np.ndarray, List[Document]]:
+    """Return (vectors [n, d] float32, documents in row order) from a LangChain FAISS index."""
+    raw = index.index
+    vectors = np.ascontiguousarray(raw.reconstruct_n(0, raw.ntotal), dtype=np.float32)
+    docs = [index.docstore.search(index.index_to_docstore_id[i]) for i in range(raw.ntotal)]
+    return vectors, docs
+
+
+def chunk_timestamps(docs: List[Document], segments: Optional[List[dict]]) -> np.ndarray:
+    """
+    Map each chunk's start_index (offset into the joined transcript) to the start time
+    of the transcript segment containing it.
+    """
+    out = np.full(len(docs), np.nan, dtype=np.float32)
+    if not segments:
+        return out
+    seg_offsets, pos = [], 0
+    for seg in segments:
+        seg_offsets.append(pos)
+        pos += len(seg["text"]) + 1  # joined with single spaces
+    seg_offsets = np.asarray(seg_offsets)
+    for i, doc in enumerate(docs):
+        start_index = doc.metadata.get("start_index")
+        if start_index is None:
+            continue
+        seg = int(np.searchsorted(seg_offsets, start_index, side="right")) - 1
+        start = segments[max(seg, 0)].get("start")
+        if start is not None:
+            out[i] = start
+    return out
+
+
+def write_bundle(path: str, model_name: str, entries: Iterable[Tuple[str, np.ndarray, List[str], np.ndarray]]) -> dict:
+    """
+    Write a bundle directory from (video_id, vectors, chunk_texts, timestamps) entries.
+    Returns the manifest.
+    """
+    os.makedirs(path, exist_ok=True)
+    videos, row, dim = [], 0, None
+    offsets = [0]
+    with open(os.path.join(path, VECTORS_FILE), "wb") as vf, \
+            open(os.path.join(path, TEXT_FILE), "wb") as tf, \
+            open(os.path.join(path, TIMESTAMPS_FILE), "wb") as sf:
+        for video_id, vectors, texts, timestamps in entries:
+            vectors = np.ascontiguousarray(vectors, dtype="<f4")
+            if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+                raise BundleError(f"Vectors/chunks mismatch for video {video_id}")
+            if dim is None:
+                dim = vectors.shape[1]
+            elif vectors.shape[1] != dim:
+                raise BundleError(f"Video {video_id} has dimension {vectors.shape[1]}, bundle has {dim}")
+            vf.write(vectors.tobytes())
+            for text in texts:
+                encoded = text.encode("utf-8")
+                tf.write(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+            sf.write(np.asarray(timestamps, dtype="<f4").tobytes())
+            videos.append({"video_id": video_id, "offset": row, "count": len(texts)})
+            row += len(texts)
+    np.asarray(offsets, dtype="<u8").tofile(os.path.join(path, OFFSETS_FILE))
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "model": model_name,
+        "dim": dim or 0,
+        "dtype": "float32",
+        "count": row,
+        "created": int(time.time()),
+        "videos": videos,
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Could not read bundle manifest in {path}: {e}")
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{path} is not a VidSage index bundle")
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle version {manifest.get('version')} (expected {BUNDLE_VERSION})")
+    # slicing the mapped arrays would silently truncate an out-of-range video
+    count = manifest.get("count", 0)
+    for video in manifest.get("videos", []):
+        lo, n = video.get("offset", -1), video.get("count", -1)
+        if lo < 0 or n < 0 or lo + n > count:
+            raise BundleError(f"Bundle {path} lists rows {lo}..{lo + n} for video {video.get('video_id')}, but holds {count} rows")
+    return manifest
+
+
+class MappedIndex(VectorStore):
+    """
+    Read-only vector store over memory-mapped bundle files. Exact L2 search like the
+    IndexFlatL2 used by LangChain's FAISS wrapper; vectors and text are never copied
+    into the heap, only the per-row norms used to speed up distance computation.
+    """
+
+    def __init__(self, vectors: np.ndarray, offsets: np.ndarray, text: np.ndarray, timestamps: np.ndarray, embedding: Any, video_id: str):
+        self.vectors = vectors
+        self.offsets = offsets
+        self.text = text
+        self.timestamps = timestamps
+        self.embedding_function = embedding
+        self.video_id = video_id
+        self._norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    @property
+    def embeddings(self):
+        return None
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def memory_footprint(self) -> Tuple[int, int]:
+        # mapped pages are file-backed and reclaimable; only the norms live on the heap
+        return self._norms.nbytes, len(self)
+
+    def get_document(self, row: int) -> Document:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        metadata = {"row": row}
+        ts = float(self.timestamps[row])
+        if not math.isnan(ts):
+            metadata["start"] = ts
+        return Document(page_content=self.text[start:end].tobytes().decode("utf-8"), metadata=metadata)
+
+    def search_by_vector(self, query: List[float], k: int = 4) -> List[Tuple[int, float]]:
+        q = np.asarray(query, dtype=np.float32)
+        dists = self._norms - 2.0 * (self.vectors @ q) + float(q @ q)
+        k = min(k, len(dists))
+        if k <= 0:
+            return []
+        top = np.argpartition(dists, k - 1)[:k]
+        top = top[np.argsort(dists[top])]
+        return [(int(i), float(dists[i])) for i in top]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self.get_document(i), d) for i, d in self.search_by_vector(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("Bundle indexes are read-only; re-ingest the video to change it")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Any, metadatas: Optional[List[dict]] = None, **kwargs: Any) -> "MappedIndex":
+        raise NotImplementedError("Build bundles with build_bundles.py")
+
+
+def load_bundle(path: str, embeddings_provider: Any, indexes: Dict[str, Any], adapter: Any = None) -> List[str]:
+    """
+    Memory-map a bundle and register each of its videos in indexes.
+    Refuses bundles built with a different embedding model or dimension (checked by
+    embedding one probe string; pass a shared adapter to reuse its probe across bundles).
+    Returns the loaded video ids.
+    """
+    from app.services.rag import EmbeddingsAdapter
+
+    manifest = read_manifest(path)
+    if adapter is None:
+        adapter = EmbeddingsAdapter(embeddings_provider)
+    _check_provider(manifest, path, embeddings_provider, adapter)
+
+    count, dim = manifest["count"], manifest["dim"]
+    try:
+        vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype="<f4", mode="r", shape=(count, dim))
+        offsets = np.memmap(os.path.join(path, OFFSETS_FILE), dtype="<u8", mode="r", shape=(count + 1,))
+        text = np.memmap(os.path.join(path, TEXT_FILE), dtype=np.uint8, mode="r")
+        timestamps = np.memmap(os.path.join(path, TIMESTAMPS_FILE), dtype="<f4", mode="r", shape=(count,))
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Bundle {path} is incomplete or truncated: {e}")
+
+    loaded = []
+    for video in manifest["videos"]:
+        lo, hi = video["offset"], video["offset"] + video["count"]
+        # slices of a memmap are views, so each video shares the bundle's mapping
+        indexes[video["video_id"]] = MappedIndex(vectors[lo:hi], offsets[lo:hi + 1], text, timestamps[lo:hi], adapter, video["video_id"])
+        loaded.append(video["video_id"])
+    logger.info("Loaded bundle %s (%d videos, model %s)", path, len(loaded), manifest["model"])
+    return loaded
+
+
+def load_bundle_dir(root: str, embeddings_provider: Any, indexes: Dict[str, Any]) -> List[str]:
+    """Load every bundle directly under root, skipping (and logging) ones that fail."""
+    from app.services.rag import EmbeddingsAdapter
+
+    adapter = EmbeddingsAdapter(embeddings_provider)
+    loaded = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if not os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+            continue
+        try:
+            loaded.extend(load_bundle(path, embeddings_provider, indexes, adapter=adapter))
+        except BundleError as e:
+            logger.warning("Skipping bundle %s: %s", path, e)
+    return loaded
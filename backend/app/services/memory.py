@@ -0,0 +1,209 @@
+# backend/app/services/memory.py
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import sys
+import time
+import threading
+import logging
+
+from app.services import prefetch
+
+logger = logging.getLogger(__name__)
+
+# Approximate memory accounting for in-memory indexes and sessions, plus a global
+# budget enforced when a new index is admitted. Estimates count vector storage
+# and chunk text; they are meant for admission decisions, not exact RSS.
+
+MEMORY_BUDGET_BYTES = int(os.environ.get("MEMORY_BUDGET_MB", "1024")) * 1024 * 1024
+# Embedding dimension assumed when estimating an index before it is built
+ESTIMATE_EMBED_DIM = int(os.environ.get("ESTIMATE_EMBED_DIM", "768"))
+# Matches the splitter defaults in rag._split_text_to_docs
+ESTIMATE_CHUNK_STRIDE = 800
+# Python object overhead per stored chunk (Document, metadata dict, docstore ids)
+PER_CHUNK_OVERHEAD = 600
+PER_TURN_OVERHEAD = 300
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when an ingest cannot be admitted under the memory budget."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 30):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+# video_id -> (id(index), bytes, chunks), refreshed whenever the stored index object changes
+_sizes: Dict[str, Tuple[int, int, int]] = {}
+_last_access: Dict[str, float] = {}
+# token -> (video_id, bytes, speculative)
+_reservations: Dict[int, Tuple[str, int, bool]] = {}
+_next_token = 0
+_lock = threading.RLock()
+
+
+def estimate_index(index: Any) -> Tuple[int, int]:
+    """Return (bytes, chunks) for a LangChain FAISS index (or any index reporting its own footprint)."""
+    if hasattr(index, "memory_footprint"):
+        return index.memory_footprint()
+    raw = getattr(index, "index", None)
+    chunks = int(getattr(raw, "ntotal", 0) or 0)
+    dim = int(getattr(raw, "d", 0) or 0)
+    nbytes = chunks * dim * 4
+
+    docstore = getattr(getattr(index, "docstore", None), "_dict", None) or {}
+    for doc in docstore.values():
+        nbytes += len(getattr(doc, "page_content", "")) + PER_CHUNK_OVERHEAD
+    if not chunks:
+        chunks = len(docstore)
+    return nbytes, chunks
+
+
+def estimate_text(text: str) -> int:
+    """Estimate the indexed size of a transcript before it is split and embedded."""
+    chunks = max(1, len(text) // ESTIMATE_CHUNK_STRIDE + 1)
+    # chunk overlap stores roughly 1.25x the transcript text
+    return chunks * (ESTIMATE_EMBED_DIM * 4 + PER_CHUNK_OVERHEAD) + int(len(text) * 1.25)
+
+
+def estimate_session(history: List[dict]) -> int:
+    return sum(len(turn.get("text", "")) + PER_TURN_OVERHEAD for turn in history)
+
+
+def touch(video_id: str) -> None:
+    _last_access[video_id] = time.time()
+
+
+def _index_size(video_id: str, index: Any) -> Tuple[int, int]:
+    cached = _sizes.get(video_id)
+    if cached is not None and cached[0] == id(index):
+        return cached[1], cached[2]
+    nbytes, chunks = estimate_index(index)
+    _sizes[video_id] = (id(index), nbytes, chunks)
+    # a new or replaced index counts as freshly used
+    touch(video_id)
+    return nbytes, chunks
+
+
+def index_stats(indexes: Dict[str, Any]) -> List[dict]:
+    """Per-video stats sorted by bytes, largest first."""
+    stats = []
+    with _lock:
+        for video_id, index in list(indexes.items()):
+            nbytes, chunks = _index_size(video_id, index)
+            stats.append({
+                "video_id": video_id,
+                "bytes": nbytes,
+                "chunks": chunks,
+                "last_access": _last_access.get(video_id),
+            })
+        # forget videos that are no longer indexed
+        for video_id in set(_sizes) - set(indexes):
+            _sizes.pop(video_id, None)
+            _last_access.pop(video_id, None)
+    stats.sort(key=lambda s: s["bytes"], reverse=True)
+    return stats
+
+
+def session_stats(sessions_map: Dict[str, List[dict]]) -> dict:
+    sizes = [estimate_session(h) for h in list(sessions_map.values())]
+    return {"count": len(sizes), "bytes": sum(sizes)}
+
+
+def used_bytes(indexes: Dict[str, Any], sessions_map: Dict[str, List[dict]], exclude: Optional[str] = None) -> int:
+    total = sum(s["bytes"] for s in index_stats(indexes) if s["video_id"] != exclude)
+    total += session_stats(sessions_map)["bytes"]
+    return total + sum(nbytes for _, nbytes, _ in _reservations.values())
+
+
+def _evict_cold_sessions(sessions_map: Dict[str, List[dict]], needed: int) -> int:
+    """Drop sessions with the oldest last turn until needed bytes are freed; returns bytes freed."""
+    freed = 0
+    cold = sorted(list(sessions_map.items()), key=lambda item: item[1][-1].get("ts", 0) if item[1] else 0)
+    for session_id, history in cold:
+        if freed >= needed:
+            break
+        sessions_map.pop(session_id, None)
+        freed += estimate_session(history)
+    if freed:
+        logger.info("Evicted cold sessions (%d bytes) to admit an ingest", freed)
+    return freed
+
+
+def _preempt_speculative(needed: int) -> int:
+    """Cancel prefetches holding budget until needed bytes are freed; returns bytes freed."""
+    freed = 0
+    for token, (video_id, nbytes, speculative) in list(_reservations.items()):
+        if freed >= needed:
+            break
+        # a prefetch that /ingest has claimed cannot be cancelled and keeps its budget
+        if speculative and prefetch.cancel(video_id, force=True):
+            # the cancelled build stops at its next batch; its release() is then a no-op
+            _reservations.pop(token, None)
+            freed += nbytes
+            logger.info("Cancelled prefetch of video %s (%d bytes) to admit an ingest", video_id, nbytes)
+    return freed
+
+
+def reserve(video_id: str, nbytes: int, indexes: Dict[str, Any], sessions_map: Dict[str, List[dict]], evict: bool = True,
+            speculative: bool = False) -> int:
+    """
+    Admit an ingest of about nbytes for video_id. Evicts least recently used indexes,
+    then cancels speculative prefetches, then drops least recently active sessions
+    (when evict is True) until it fits, otherwise raises MemoryBudgetExceeded.
+    speculative marks a prefetch's reservation, which later ingests may take back.
+    Returns a reservation token to pass to release() once the index is stored.
+    """
+    global _next_token
+    with _lock:
+        if nbytes > MEMORY_BUDGET_BYTES:
+            raise MemoryBudgetExceeded(
+                f"Video {video_id} needs ~{nbytes // (1024 * 1024)} MB, more than the whole memory budget",
+                status_code=503,
+            )
+
+        # an existing index for this video is replaced, so it does not count against it
+        used = used_bytes(indexes, sessions_map, exclude=video_id)
+        if used + nbytes > MEMORY_BUDGET_BYTES and evict:
+            cold = sorted(
+                (s for s in index_stats(indexes) if s["video_id"] != video_id),
+                key=lambda s: s["last_access"] or 0,
+            )
+            for s in cold:
+                if used + nbytes <= MEMORY_BUDGET_BYTES:
+                    break
+                indexes.pop(s["video_id"], None)
+                _sizes.pop(s["video_id"], None)
+                _last_access.pop(s["video_id"], None)
+                used -= s["bytes"]
+                logger.info("Evicted index for video %s (%d bytes) to admit %s", s["video_id"], s["bytes"], video_id)
+            if used + nbytes > MEMORY_BUDGET_BYTES:
+                used -= _preempt_speculative(used + nbytes - MEMORY_BUDGET_BYTES)
+            if used + nbytes > MEMORY_BUDGET_BYTES:
+                used -= _evict_cold_sessions(sessions_map, used + nbytes - MEMORY_BUDGET_BYTES)
+
+        if used + nbytes > MEMORY_BUDGET_BYTES:
+            # other ingests hold the remaining budget; those finish soon, so ask to retry
+            if _reservations:
+                raise MemoryBudgetExceeded("Too many ingests in progress for the memory budget; retry shortly", status_code=429, retry_after=5)
+            raise MemoryBudgetExceeded("Memory budget exhausted; try again later", status_code=503)
+
+        _next_token += 1
+        _reservations[_next_token] = (video_id, nbytes, speculative)
+        return _next_token
+
+
+def release(token: int) -> None:
+    with _lock:
+        _reservations.pop(token, None)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux /proc, falling back to peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,228 @@
+# backend/app/services/prefetch.py
+from typing import Callable, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Speculative ingest started by the extension as soon as a video page loads.
+# Jobs run on a small dedicated pool so they never take threads from the request
+# threadpool, and each stage waits until no interactive request is in flight.
+
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "1"))
+# How long /ingest will wait for an already-running prefetch of the same video
+CLAIM_TIMEOUT_SECONDS = float(os.environ.get("PREFETCH_CLAIM_TIMEOUT", "120"))
+# Upper bound on how long a prefetch stage yields to interactive work
+MAX_YIELD_SECONDS = float(os.environ.get("PREFETCH_MAX_YIELD", "30"))
+# Chunk counts of recently finished prefetches, kept so /ingest can reuse them
+DONE_KEPT = int(os.environ.get("PREFETCH_DONE_KEPT", "256"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class PrefetchJob:
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+        self.state = QUEUED
+        self.chunks: Optional[int] = None
+        self.error: Optional[str] = None
+        self.requesters = 1
+        # set once /ingest is waiting on this job; it then stops yielding to interactive work
+        # (the waiting /ingest also counts as a requester, so closing tabs cannot cancel it)
+        self.claimed = False
+        self.finished = threading.Event()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+_jobs: Dict[str, PrefetchJob] = {}
+# video_id -> chunks for finished prefetches not yet claimed (bounded, oldest dropped first)
+_done: "OrderedDict[str, int]" = OrderedDict()
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="vidsage-prefetch")
+
+_interactive_count = 0
+_idle = threading.Condition()
+
+
+@contextmanager
+def interactive():
+    """Mark an interactive request (ingest/query) as in flight so prefetch work yields to it."""
+    global _interactive_count
+    with _idle:
+        _interactive_count += 1
+    try:
+        yield
+    finally:
+        with _idle:
+            _interactive_count -= 1
+            if _interactive_count == 0:
+                _idle.notify_all()
+
+
+def _wake() -> None:
+    # let yielding jobs re-check their state (e.g. after a cancel)
+    with _idle:
+        _idle.notify_all()
+
+
+def _checkpoint(job: PrefetchJob) -> None:
+    if job.state == CANCELLED:
+        raise _Cancelled()
+    if not job.claimed:
+        with _idle:
+            _idle.wait_for(lambda: _interactive_count == 0 or job.state == CANCELLED or job.claimed, timeout=MAX_YIELD_SECONDS)
+    if job.state == CANCELLED:
+        raise _Cancelled()
+
+
+def _batch_checkpoint(job: PrefetchJob) -> Callable[[], None]:
+    """Handed to build_index as cancel_check: each embedding batch yields like any other stage."""
+    def check() -> None:
+        _checkpoint(job)
+    return check
+
+
+def _finish(job: PrefetchJob, state: str) -> None:
+    with _lock:
+        # a cancel may have raced with the last stage; keep it cancelled
+        if job.state != CANCELLED:
+            job.state = state
+        if _jobs.get(job.video_id) is job and job.state in (FAILED, CANCELLED):
+            _jobs.pop(job.video_id, None)
+    job.finished.set()
+
+
+def _run(job: PrefetchJob, fetch_text: Callable[[str], str], build_index: Callable[..., int], indexes: Dict) -> None:
+    try:
+        _checkpoint(job)
+        with _lock:
+            if job.state == CANCELLED:
+                raise _Cancelled()
+            job.state = RUNNING
+
+        text = fetch_text(job.video_id)
+        _checkpoint(job)
+
+        # build into a scratch map so a cancelled job never publishes its index
+        scratch: Dict = {}
+        chunks = build_index(job.video_id, text, scratch, cancel_check=_batch_checkpoint(job))
+
+        with _lock:
+            if job.state == CANCELLED:
+                raise _Cancelled()
+            indexes[job.video_id] = scratch[job.video_id]
+            job.chunks = chunks
+            # published: the job itself is no longer needed, only its chunk count
+            if _jobs.get(job.video_id) is job:
+                _jobs.pop(job.video_id, None)
+            _done[job.video_id] = chunks
+            _done.move_to_end(job.video_id)
+            while len(_done) > DONE_KEPT:
+                _done.popitem(last=False)
+        _finish(job, DONE)
+        logger.info("Prefetched video %s (%d chunks)", job.video_id, chunks)
+    except _Cancelled:
+        logger.info("Prefetch cancelled for video %s", job.video_id)
+        _finish(job, CANCELLED)
+    except Exception as e:
+        logger.warning("Prefetch failed for video %s: %s", job.video_id, e)
+        job.error = str(e)
+        _finish(job, FAILED)
+
+
+def schedule(video_id: str, fetch_text: Callable[[str], str], build_index: Callable[..., int], indexes: Dict) -> str:
+    """
+    Queue a background ingest for video_id unless one is already queued or running,
+    or the video is already indexed. build_index(video_id, text, indexes, cancel_check=...)
+    must call cancel_check before each embedding batch; it waits out interactive
+    requests and raises when the job is cancelled.
+    Returns the resulting job state ("done" if the video is already indexed).
+    """
+    with _lock:
+        job = _jobs.get(video_id)
+        if job is not None and job.state in (QUEUED, RUNNING):
+            job.requesters += 1
+            return job.state
+        if video_id in indexes:
+            return DONE
+        job = PrefetchJob(video_id)
+        _jobs[video_id] = job
+    _executor.submit(_run, job, fetch_text, build_index, indexes)
+    return QUEUED
+
+
+def cancel(video_id: str, force: bool = False) -> bool:
+    """
+    Drop one requester's interest in a prefetch. The job is cancelled only when no
+    requester is left; a finished index is kept. force cancels it regardless (used to
+    free memory budget for interactive ingests) unless an /ingest has claimed it.
+    Returns True if the job was cancelled.
+    """
+    with _lock:
+        job = _jobs.get(video_id)
+        if job is None or job.state not in (QUEUED, RUNNING):
+            return False
+        if force:
+            if job.claimed:
+                return False
+        else:
+            job.requesters -= 1
+            if job.requesters > 0:
+                return False
+        job.state = CANCELLED
+        _jobs.pop(video_id, None)
+    _wake()
+    return True
+
+
+def claim(video_id: str, indexes: Dict, timeout: float = CLAIM_TIMEOUT_SECONDS) -> Optional[int]:
+    """
+    Called by the interactive /ingest path. Returns the chunk count of a completed
+    prefetch (waiting for a running one up to timeout), or None if the caller should
+    ingest itself. A prefetch that has not started yet is cancelled in favour of the caller.
+    """
+    with _lock:
+        job = _jobs.get(video_id)
+        if job is None:
+            chunks = _done.pop(video_id, None)
+            return chunks if video_id in indexes else None
+        if job.state == QUEUED:
+            job.state = CANCELLED
+            _jobs.pop(video_id, None)
+        else:
+            job.claimed = True
+            job.requesters += 1
+    if job.state == CANCELLED:
+        _wake()
+        return None
+    # a claimed job stops yielding to interactive work
+    _wake()
+
+    if not job.finished.wait(timeout):
+        with _lock:
+            job.requesters -= 1
+        return None
+    with _lock:
+        if _jobs.get(video_id) is job:
+            _jobs.pop(video_id, None)
+        _done.pop(video_id, None)
+        if job.state != DONE or video_id not in indexes:
+            return None
+        return job.chunks
+
+
+def status(video_id: str) -> Optional[str]:
+    with _lock:
+        job = _jobs.get(video_id)
+        return job.state if job is not None else None
@@ -0,0 +1,213 @@
+# backend/app/services/profiling.py
+from typing import List, Optional
+from collections import Counter, deque
+from contextlib import contextmanager
+import contextvars
+import cProfile
+import heapq
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lightweight request tracing plus opt-in per-request profiling.
+#
+# Every request handled through request_trace() records stage timings (a few
+# perf_counter calls); the N slowest traces are kept for /admin/traces. When a
+# request asks for it (header or admin toggle) a profiler runs for that request
+# only and its output is stored for /admin/profiles/{id}:
+#   "sample"   - stack sampler on the request's thread, collapsed-stack output
+#                (flamegraph.pl / speedscope compatible)
+#   "cprofile" - deterministic cProfile, pstats text sorted by cumulative time.
+#                On Python 3.12+ cProfile hooks sys.monitoring, which is process-wide:
+#                it would record every other request's threads and slow them all
+#                down, so there "cprofile" requests are served by the sampler instead
+#                (the stored profile reports mode "sample").
+
+SLOW_TRACES_KEPT = int(os.environ.get("PROFILE_SLOW_TRACES", "50"))
+# Slow traces older than this roll out of the buffer so it reflects recent traffic
+SLOW_TRACES_WINDOW_SECONDS = float(os.environ.get("PROFILE_TRACE_WINDOW_S", "3600"))
+PROFILES_KEPT = int(os.environ.get("PROFILE_STORED", "20"))
+SAMPLE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000.0
+
+MODES = ("sample", "cprofile")
+# cProfile only profiles the enabling thread before 3.12
+CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("vidsage_trace", default=None)
+
+_lock = threading.Lock()
+# min-heap of (duration, seq, trace) so the fastest of the kept traces is dropped first
+_slowest: List[tuple] = []
+_seq = itertools.count()
+_profiles: "deque[dict]" = deque(maxlen=PROFILES_KEPT)
+
+# Admin toggle: profile the next `remaining` requests (optionally for one video only)
+_toggle = {"mode": None, "video_id": None, "remaining": 0}
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval and counts collapsed stacks."""
+
+    def __init__(self, target_ident: int, interval: float):
+        super().__init__(name="vidsage-profiler", daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":"))
+                frame = frame.f_back
+            self.counts[";".join(reversed(names))] += 1
+
+    def stop(self) -> str:
+        self._stop_event.set()
+        self.join()
+        return "\n".join(f"{stack} {n}" for stack, n in self.counts.most_common())
+
+
+def configure(mode: Optional[str], video_id: Optional[str] = None, count: int = 1) -> dict:
+    """Admin toggle: profile the next `count` requests (for video_id if given); mode None disables."""
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+    with _lock:
+        _toggle.update(mode=mode, video_id=video_id, remaining=count if mode else 0)
+        return dict(_toggle)
+
+
+def _mode_from_toggle(video_id: Optional[str]) -> Optional[str]:
+    # unlocked fast path: almost always disabled
+    if not _toggle["remaining"]:
+        return None
+    with _lock:
+        if _toggle["remaining"] and (_toggle["video_id"] in (None, video_id)):
+            _toggle["remaining"] -= 1
+            return _toggle["mode"]
+    return None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request; a no-op outside request_trace()."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace["stages"].append((name, time.perf_counter() - start))
+
+
+@contextmanager
+def request_trace(endpoint: str, video_id: Optional[str] = None, profile: Optional[str] = None):
+    """
+    Trace one request. profile ("sample"/"cprofile") runs a profiler for this request;
+    otherwise the admin toggle may select one. Yields the trace dict, whose "profile_id"
+    is set (before the body runs) when a profile will be stored.
+    """
+    mode = profile or _mode_from_toggle(video_id)
+    if mode == "cprofile" and not CPROFILE_PER_THREAD:
+        mode = "sample"
+    trace = {
+        "endpoint": endpoint,
+        "video_id": video_id,
+        "started": time.time(),
+        "stages": [],
+        "profile_id": uuid.uuid4().hex if mode else None,
+    }
+    token = _current.set(trace)
+
+    sampler = profiler = None
+    if mode == "sample":
+        sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL_SECONDS)
+        sampler.start()
+    elif mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another deterministic profiler is already active in this process
+            profiler = None
+            mode = "sample"
+            sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL_SECONDS)
+            sampler.start()
+
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        duration = time.perf_counter() - start
+        _current.reset(token)
+        output = None
+        if sampler is not None:
+            output = sampler.stop()
+        elif profiler is not None:
+            profiler.disable()
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(60)
+            output = buf.getvalue()
+        _record(trace, duration, mode, output)
+
+
+def _record(trace: dict, duration: float, mode: Optional[str], output: Optional[str]) -> None:
+    trace["duration_ms"] = duration * 1000
+    trace["stages"] = [{"stage": name, "ms": secs * 1000} for name, secs in trace["stages"]]
+    with _lock:
+        _expire_locked()
+        item = (duration, next(_seq), trace)
+        if len(_slowest) < SLOW_TRACES_KEPT:
+            heapq.heappush(_slowest, item)
+        elif duration > _slowest[0][0]:
+            heapq.heapreplace(_slowest, item)
+        if output is not None:
+            _profiles.append({"id": trace["profile_id"], "mode": mode, "trace": trace, "output": output})
+
+
+def _expire_locked() -> None:
+    cutoff = time.time() - SLOW_TRACES_WINDOW_SECONDS
+    if _slowest and any(t["started"] < cutoff for _, _, t in _slowest):
+        _slowest[:] = [item for item in _slowest if item[2]["started"] >= cutoff]
+        heapq.heapify(_slowest)
+
+
+def slowest_traces() -> List[dict]:
+    with _lock:
+        _expire_locked()
+        return [t for _, _, t in sorted(_slowest, key=lambda item: item[0], reverse=True)]
+
+
+def list_profiles() -> List[dict]:
+    with _lock:
+        return [{"id": p["id"], "mode": p["mode"], "endpoint": p["trace"]["endpoint"], "video_id": p["trace"]["video_id"],
+                 "duration_ms": p["trace"]["duration_ms"]} for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    with _lock:
+        for p in _profiles:
+            if p["id"] == profile_id:
+                return p
+    return None
+
+
+def reset() -> None:
+    with _lock:
+        _slowest.clear()
+        _profiles.clear()
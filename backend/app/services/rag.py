@@ -1,17 +1,31 @@
 # backend/app/services/rag.py
-from typing import Dict, Any, List, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
+import os
 import uuid
 import logging
 import asyncio
+import numpy as np
+from app.services.profiling import stage
 
 logger = logging.getLogger(__name__)
 
 # In-memory store mapping video_id -> FAISS index wrapper
 INDEXES: Dict[str, Any] = {}
 
+# Maximal-marginal-relevance re-ranking of retrieved chunks (see mmr_select)
+RERANK_ENABLED = os.environ.get("RERANK", "mmr").lower() == "mmr"
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.5"))
+MMR_FETCH_K = int(os.environ.get("MMR_FETCH_K", "20"))
+MMR_MIN_K = int(os.environ.get("MMR_MIN_K", "2"))
+MMR_SCORE_GAP = float(os.environ.get("MMR_SCORE_GAP", "0.15"))
+MMR_DUPLICATE_THRESHOLD = float(os.environ.get("MMR_DUPLICATE_THRESHOLD", "0.95"))
+
+# Chunks embedded per provider call when an ingest can be cancelled between batches
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "16"))
+
 
 class EmbeddingsAdapter:
     """
@@ -22,10 +36,24 @@ class EmbeddingsAdapter:
       - embed_documents, embed_texts, embed_query, or the provider being callable.
     """
 
-    def __init__(self, inner: Any):
+    def __init__(self, inner: Any, cancel_check: Optional[Callable[[], None]] = None, batch_size: int = EMBED_BATCH_SIZE):
         self.inner = inner
+        # When set, documents are embedded in batches and cancel_check() runs before each
+        # batch; it raises to abort the ingest.
+        self.cancel_check = cancel_check
+        self.batch_size = batch_size
+        self._dimension: Optional[int] = None
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.cancel_check is None:
+            return self._embed_batch(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            self.cancel_check()
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return vectors
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
         # Preferred methods
         if hasattr(self.inner, "embed_documents"):
             return self.inner.embed_documents(texts)
@@ -58,30 +86,41 @@ class EmbeddingsAdapter:
             return out
         raise TypeError("Embedding provider does not support query embedding (no embed_query/embed_texts/embed_documents/callable)")
 
+    def dimension(self, probe_text: str = "dimension probe") -> int:
+        """Embedding width, measured once by embedding probe_text and then cached."""
+        if self._dimension is None:
+            self._dimension = len(self(probe_text))
+        return self._dimension
+
     def __repr__(self):
         return f"EmbeddingsAdapter(inner={type(self.inner)})"
 
 
 def _split_text_to_docs(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    # start_index lets offline bundles map chunks back to transcript timestamps
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     docs = splitter.create_documents([text])
     return docs
 
 
-def ingest_video_to_index(video_id: str, text: str, embeddings_provider: Any, existing_indexes: Dict[str, Any]) -> int:
+def ingest_video_to_index(video_id: str, text: str, embeddings_provider: Any, existing_indexes: Dict[str, Any],
+                          cancel_check: Optional[Callable[[], None]] = None) -> int:
     """
     Splits transcript text into chunks, embeds and indexes using FAISS via LangChain wrapper.
     Stores index in existing_indexes dict under video_id.
+    If cancel_check is given it is called between embedding batches and may raise to abort.
     Returns number of chunks.
     """
-    docs = _split_text_to_docs(text)
+    with stage("split"):
+        docs = _split_text_to_docs(text)
     if not docs:
         raise ValueError("No docs created from transcript")
 
-    adapter = EmbeddingsAdapter(embeddings_provider)
+    adapter = EmbeddingsAdapter(embeddings_provider, cancel_check=cancel_check)
 
     logger.info("Indexing %d docs for video %s", len(docs), video_id)
-    index = FAISS.from_documents(docs, adapter)
+    with stage("embed_index"):
+        index = FAISS.from_documents(docs, adapter)
     # Sanity-check: ensure FAISS has a callable embedding function for queries
     try:
         if not callable(getattr(index, "embedding_function", adapter)):
@@ -156,9 +195,100 @@ async def _async_invoke_retriever(retriever: Any, question: str, k: int) -> List
         raise
 
 
-def retrieve_docs_for_question(video_id: str, question: str, existing_indexes: Dict[str, Any], k: int = 4) -> List[Document]:
+def mmr_select(
+    query_vec: np.ndarray,
+    cand_vecs: np.ndarray,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    min_k: int = MMR_MIN_K,
+    score_gap: float = MMR_SCORE_GAP,
+    duplicate_threshold: float = MMR_DUPLICATE_THRESHOLD,
+) -> List[int]:
+    """
+    Pick up to k candidate rows by maximal marginal relevance, using cosine similarity.
+    lambda_mult trades relevance (1.0) against diversity (0.0). The pool is first cut at
+    the first relevance drop larger than score_gap (keeping at least min_k), so clearly
+    off-topic candidates are never used to fill k; candidates whose similarity to an
+    already selected one exceeds duplicate_threshold are skipped, so fewer than k rows
+    may come back. Returns candidate row numbers in selection order.
+    """
+    n = len(cand_vecs)
+    if n == 0 or k <= 0:
+        return []
+    q = np.asarray(query_vec, dtype=np.float32)
+    c = np.asarray(cand_vecs, dtype=np.float32)
+    c = c / np.maximum(np.linalg.norm(c, axis=1, keepdims=True), 1e-12)
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+    rel = c @ q
+
+    # adaptive k: stop the pool at the first large gap in the sorted relevance scores
+    order = np.argsort(-rel)
+    gaps = rel[order[:-1]] - rel[order[1:]]
+    big = np.nonzero(gaps[max(min_k, 1) - 1:] > score_gap)[0]
+    if len(big):
+        order = order[:big[0] + max(min_k, 1)]
+
+    pool = c[order]
+    pool_rel = rel[order]
+    sims = pool @ pool.T
+
+    selected = [0]
+    max_sim = sims[0].copy()
+    blocked = np.zeros(len(order), dtype=bool)
+    blocked[0] = True
+    while len(selected) < min(k, len(order)):
+        blocked |= max_sim > duplicate_threshold
+        if blocked.all():
+            break
+        scores = lambda_mult * pool_rel - (1.0 - lambda_mult) * max_sim
+        scores[blocked] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        blocked[best] = True
+        np.maximum(max_sim, sims[best], out=max_sim)
+    return [int(order[i]) for i in selected]
+
+
+def _embed_query(index: Any, question: str) -> List[float]:
+    if hasattr(index, "_embed_query"):
+        return index._embed_query(question)
+    return index.embedding_function(question)
+
+
+def _fetch_candidates(index: Any, query_vec: List[float], fetch_k: int) -> Tuple[List[Document], np.ndarray]:
     """
-    Retrieve top-k documents for a given question using the stored index.
+    Nearest fetch_k chunks with their stored vectors, read back from the index (no re-embedding).
+    Supports LangChain FAISS indexes and bundle-backed MappedIndex.
+    """
+    if hasattr(index, "search_by_vector"):
+        rows = [row for row, _ in index.search_by_vector(query_vec, fetch_k)]
+        return [index.get_document(r) for r in rows], np.asarray(index.vectors[rows], dtype=np.float32)
+
+    raw = index.index
+    _, ids = raw.search(np.asarray([query_vec], dtype=np.float32), min(fetch_k, raw.ntotal))
+    ids = [int(i) for i in ids[0] if i >= 0]
+    if hasattr(raw, "reconstruct_batch"):
+        vecs = raw.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+    else:
+        vecs = np.vstack([raw.reconstruct(i) for i in ids]) if ids else np.zeros((0, raw.d), dtype=np.float32)
+    docs = [index.docstore.search(index.index_to_docstore_id[i]) for i in ids]
+    return docs, np.asarray(vecs, dtype=np.float32)
+
+
+def _retrieve_reranked(index: Any, question: str, k: int, lambda_mult: float) -> List[Document]:
+    query_vec = _embed_query(index, question)
+    docs, vecs = _fetch_candidates(index, query_vec, max(MMR_FETCH_K, k))
+    with stage("rerank"):
+        picked = mmr_select(np.asarray(query_vec, dtype=np.float32), vecs, k, lambda_mult=lambda_mult)
+    return [docs[i] for i in picked]
+
+
+def retrieve_docs_for_question(video_id: str, question: str, existing_indexes: Dict[str, Any], k: int = 4,
+                               rerank: Optional[bool] = None, lambda_mult: float = MMR_LAMBDA) -> List[Document]:
+    """
+    Retrieve up to k documents for a given question using the stored index.
+    With rerank (default: RERANK env, "mmr"), over-fetches candidates and returns a
+    diverse, non-redundant subset via mmr_select; otherwise plain top-k similarity.
     This is a synchronous helper — if you are in an async FastAPI endpoint, consider
     calling retrieve_docs_for_question_async instead.
     """
@@ -166,13 +296,18 @@ def retrieve_docs_for_question(video_id: str, question: str, existing_indexes: D
         raise KeyError("No index found for video_id: " + video_id)
 
     index = existing_indexes[video_id]
+    use_rerank = RERANK_ENABLED if rerank is None else rerank
+    if use_rerank:
+        return _retrieve_reranked(index, question, k, lambda_mult)
+
     retriever = index.as_retriever(search_type="similarity", search_kwargs={"k": k})
 
     docs = _sync_invoke_retriever(retriever, question, k)
     return docs
 
 
-async def retrieve_docs_for_question_async(video_id: str, question: str, existing_indexes: Dict[str, Any], k: int = 4) -> List[Document]:
+async def retrieve_docs_for_question_async(video_id: str, question: str, existing_indexes: Dict[str, Any], k: int = 4,
+                                           rerank: Optional[bool] = None, lambda_mult: float = MMR_LAMBDA) -> List[Document]:
     """
     Async version to be used inside async endpoints.
     """
@@ -180,6 +315,11 @@ async def retrieve_docs_for_question_async(video_id: str, question: str, existin
         raise KeyError("No index found for video_id: " + video_id)
 
     index = existing_indexes[video_id]
+    use_rerank = RERANK_ENABLED if rerank is None else rerank
+    if use_rerank:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: _retrieve_reranked(index, question, k, lambda_mult))
+
     retriever = index.as_retriever(search_type="similarity", search_kwargs={"k": k})
 
     docs = await _async_invoke_retriever(retriever, question, k)
@@ -247,11 +387,14 @@ def answer_question(video_id: str, session_history: List[dict], question: str, e
     Retrieve context and ask the LLM to answer. Returns answer text and list of source snippets.
     Synchronous version.
     """
-    retrieved = retrieve_docs_for_question(video_id, question, indexes_map, k=4)
-    prompt = build_prompt(retrieved, session_history, question)
+    with stage("retrieve"):
+        retrieved = retrieve_docs_for_question(video_id, question, indexes_map, k=4)
+    with stage("build_prompt"):
+        prompt = build_prompt(retrieved, session_history, question)
 
     try:
-        result = llm_provider.generate(prompt)
+        with stage("llm"):
+            result = llm_provider.generate(prompt)
     except Exception:
         logger.exception("LLM provider failed to generate for prompt (truncated): %.200s", prompt)
         raise
@@ -1,5 +1,6 @@
 # backend/app/services/sessions.py
 from typing import Dict, List
+import os
 import time
 
 # Simple in-memory session store for prototypes.
@@ -10,19 +11,27 @@ SessionHistory = Dict[str, List[Dict]]
 _sessions: SessionHistory = {}
 
 MAX_HISTORY_ENTRIES = 12  # keep last N messages
+# Least recently active sessions are dropped beyond this many
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "10000"))
 
 
 def get_history(session_id: str) -> List[dict]:
     return _sessions.get(session_id, [])
 
 
+def get_all_sessions() -> SessionHistory:
+    return _sessions
+
+
 def append_turn(session_id: str, role: str, text: str) -> None:
-    if session_id not in _sessions:
-        _sessions[session_id] = []
+    # re-insert so dict order runs from least to most recently active
+    _sessions[session_id] = _sessions.pop(session_id, [])
     _sessions[session_id].append({"role": role, "text": text, "ts": int(time.time())})
     # trim
     if len(_sessions[session_id]) > MAX_HISTORY_ENTRIES:
         _sessions[session_id] = _sessions[session_id][-MAX_HISTORY_ENTRIES:]
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.pop(next(iter(_sessions)), None)
 
 
 def clear_session(session_id: str) -> None:
@@ -1,10 +1,22 @@
 # backend/app/services/transcript.py (patch)
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from typing import Optional
+from typing import List, Optional
+import os
 import logging
+import requests
 
 logger = logging.getLogger(__name__)
 
+# When set, transcripts are read from this server instead of YouTube
+# (used with the offline stand-in in loadtest/stub_provider.py).
+TRANSCRIPT_STUB_URL = os.environ.get("TRANSCRIPT_STUB_URL", None)
+
+
+def _fetch_stub_transcript(video_id: str) -> List[dict]:
+    resp = requests.get(f"{TRANSCRIPT_STUB_URL.rstrip('/')}/transcripts/{video_id}", timeout=30)
+    resp.raise_for_status()
+    return [{"text": seg.get("text", ""), "start": seg.get("start")} for seg in resp.json() if seg.get("text")]
+
 
 def fetch_transcript_text(video_id: str, languages: list[str] = None) -> str:
     """
@@ -12,9 +24,24 @@ def fetch_transcript_text(video_id: str, languages: list[str] = None) -> str:
     Tries preferred languages first, otherwise tries available transcripts.
     Raises an exception if transcripts not available.
     """
+    return join_segments(fetch_transcript_segments(video_id, languages=languages))
+
+
+def join_segments(segments: List[dict]) -> str:
+    return " ".join(seg["text"] for seg in segments)
+
+
+def fetch_transcript_segments(video_id: str, languages: list[str] = None) -> List[dict]:
+    """
+    Fetch transcript segments as [{"text": str, "start": float | None}], skipping empty ones.
+    Joining their text with single spaces gives fetch_transcript_text's output.
+    """
     if languages is None:
         languages = ["en"]
 
+    if TRANSCRIPT_STUB_URL:
+        return _fetch_stub_transcript(video_id)
+
     try:
         api = YouTubeTranscriptApi()
 
@@ -67,10 +94,14 @@ def fetch_transcript_text(video_id: str, languages: list[str] = None) -> str:
             except Exception:
                 return ""
 
-        texts = [_segment_text(s) for s in transcript_list]
-        # Filter out empty pieces and join
-        text = " ".join(t for t in texts if t)
-        return text
+        def _segment_start(seg):
+            if isinstance(seg, dict):
+                return seg.get("start")
+            return getattr(seg, "start", None)
+
+        # Filter out empty pieces
+        segments = [{"text": _segment_text(s), "start": _segment_start(s)} for s in transcript_list]
+        return [seg for seg in segments if seg["text"]]
 
     except TranscriptsDisabled as te:
         logger.error("Transcripts disabled for video %s: %s", video_id, te)
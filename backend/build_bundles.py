@@ -0,0 +1,82 @@
+# backend/build_bundles.py
+"""
+Build portable index bundles offline, using the same split + embed pipeline as /ingest.
+
+  python build_bundles.py VIDEO_ID [VIDEO_ID ...] --out bundles/
+  python build_bundles.py --ids-file videos.txt --out bundles/ --shard lectures-01
+
+Without --shard each video gets its own bundle directory (bundles/<video_id>/);
+with --shard all videos go into one bundle. Load them on a serving node with
+INDEX_BUNDLE_DIR=bundles/ or POST /admin/bundles {"path": "bundles/<name>"}.
+The embedding provider is configured exactly as for the server (see app/deps.py).
+"""
+import argparse
+import logging
+import os
+import sys
+
+from app.deps import EMB_PROVIDER
+from app.services import transcript, rag, bundles
+
+logger = logging.getLogger("build_bundles")
+
+
+def build_entry(video_id: str, languages: list):
+    segments = transcript.fetch_transcript_segments(video_id, languages=languages)
+    text = transcript.join_segments(segments)
+    scratch = {}
+    rag.ingest_video_to_index(video_id, text, EMB_PROVIDER, scratch)
+    vectors, docs = bundles.export_faiss(scratch[video_id])
+    return video_id, vectors, [d.page_content for d in docs], bundles.chunk_timestamps(docs, segments)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_ids", nargs="*")
+    parser.add_argument("--ids-file", help="file with one video id per line")
+    parser.add_argument("--out", required=True, help="output directory for bundles")
+    parser.add_argument("--shard", help="write all videos into a single bundle with this name")
+    parser.add_argument("--languages", default="en", help="comma separated transcript languages")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    video_ids = list(args.video_ids)
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            video_ids.extend(line.strip() for line in f if line.strip())
+    if not video_ids:
+        parser.error("no video ids given")
+
+    try:
+        model_name = bundles.provider_model_name(EMB_PROVIDER)
+    except bundles.BundleError as e:
+        logger.error("%s", e)
+        return 2
+    languages = args.languages.split(",")
+
+    entries, failed = [], []
+    for video_id in video_ids:
+        try:
+            entry = build_entry(video_id, languages)
+        except Exception as e:
+            logger.error("Failed to build %s: %s", video_id, e)
+            failed.append(video_id)
+            continue
+        if args.shard:
+            entries.append(entry)
+        else:
+            manifest = bundles.write_bundle(os.path.join(args.out, video_id), model_name, [entry])
+            logger.info("Wrote bundle for %s (%d chunks, dim %d)", video_id, manifest["count"], manifest["dim"])
+
+    if args.shard and entries:
+        manifest = bundles.write_bundle(os.path.join(args.out, args.shard), model_name, entries)
+        logger.info("Wrote shard %s (%d videos, %d chunks, dim %d)", args.shard, len(entries), manifest["count"], manifest["dim"])
+
+    if failed:
+        logger.error("%d of %d videos failed: %s", len(failed), len(video_ids), ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
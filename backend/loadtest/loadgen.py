@@ -0,0 +1,200 @@
+# backend/loadtest/loadgen.py
+"""
+Async load generator for the VidSage backend.
+
+Drives /ingest and /query with a weighted mix at increasing concurrency and
+reports throughput, latency percentiles and error rate per level:
+
+  python -m loadtest.loadgen --base-url http://127.0.0.1:8000 \\
+      --concurrency 1,2,4,8,16,32 --duration 30 --mix query=0.9,ingest=0.1 --json results.json
+
+Each virtual user keeps its own session and asks a few follow-up questions about
+one video before moving to another, so conversation history grows realistically.
+Run against a backend wired to loadtest/stub_provider.py to stay fully offline.
+
+404s (video not ingested on the worker that answered) are reported separately from
+errors: indexes are per process, so multi-worker runs need sticky routing or
+per-worker ingest. Provider failures come back from the backend as 502.
+"""
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+QUESTIONS = [
+    "What is the main topic of this video?",
+    "Summarize the video in three points.",
+    "Was fusion discussed?",
+    "What examples does the speaker give?",
+    "Explain the part about training data.",
+    "Who is the intended audience?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.not_found: Dict[str, int] = {}
+        self.status_counts: Dict[int, int] = {}
+
+    def record(self, op: str, seconds: float, status: int) -> None:
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if 200 <= status < 300:
+            self.latencies.setdefault(op, []).append(seconds)
+        elif status == 404:
+            # routing/ingest problem, not a provider or capacity failure
+            self.not_found[op] = self.not_found.get(op, 0) + 1
+        else:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self, concurrency: int, elapsed: float) -> dict:
+        ok = sum(len(v) for v in self.latencies.values())
+        errors = sum(self.errors.values())
+        not_found = sum(self.not_found.values())
+        ops = {}
+        for op in sorted(set(self.latencies) | set(self.errors) | set(self.not_found)):
+            lat = self.latencies.get(op, [])
+            ops[op] = {
+                "ok": len(lat),
+                "errors": self.errors.get(op, 0),
+                "not_found": self.not_found.get(op, 0),
+                "p50_ms": percentile(lat, 50) * 1000,
+                "p95_ms": percentile(lat, 95) * 1000,
+                "p99_ms": percentile(lat, 99) * 1000,
+                "max_ms": max(lat) * 1000 if lat else 0.0,
+            }
+        return {
+            "concurrency": concurrency,
+            "elapsed_s": elapsed,
+            "throughput_rps": ok / elapsed if elapsed else 0.0,
+            "error_rate": errors / (ok + errors) if ok + errors else 0.0,
+            "provider_errors": self.status_counts.get(502, 0),
+            "not_found": not_found,
+            "status_counts": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "ops": ops,
+        }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"query", "ingest"}
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {sorted(unknown)}")
+    return mix
+
+
+class LoadRunner:
+    def __init__(self, client: httpx.AsyncClient, videos: List[str], mix: Dict[str, float], questions_per_video: int = 4):
+        self.client = client
+        self.videos = videos
+        self.ingested: List[str] = []
+        self.mix = mix
+        self.questions_per_video = questions_per_video
+
+    async def _timed(self, stats: Stats, op: str, method: str, url: str, **kwargs) -> int:
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+            status = resp.status_code
+        except httpx.HTTPError:
+            status = 599
+        stats.record(op, time.perf_counter() - start, status)
+        return status
+
+    async def ingest(self, stats: Stats, video_id: str) -> None:
+        status = await self._timed(stats, "ingest", "POST", f"/ingest/{video_id}")
+        if status == 200 and video_id not in self.ingested:
+            self.ingested.append(video_id)
+
+    async def warm_up(self, count: int) -> None:
+        stats = Stats()
+        for video_id in self.videos[:count]:
+            await self.ingest(stats, video_id)
+
+    async def user(self, stats: Stats, deadline: float) -> None:
+        ops, weights = zip(*self.mix.items())
+        while time.perf_counter() < deadline:
+            if random.choices(ops, weights)[0] == "ingest" or not self.ingested:
+                await self.ingest(stats, random.choice(self.videos))
+                continue
+            video_id = random.choice(self.ingested)
+            session_id = str(uuid.uuid4())
+            for _ in range(random.randint(1, self.questions_per_video)):
+                if time.perf_counter() >= deadline:
+                    break
+                payload = {"session_id": session_id, "video_id": video_id, "question": random.choice(QUESTIONS)}
+                await self._timed(stats, "query", "POST", "/query", json=payload)
+
+    async def run_level(self, concurrency: int, duration: float) -> dict:
+        stats = Stats()
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(self.user(stats, deadline) for _ in range(concurrency)))
+        return stats.summary(concurrency, time.perf_counter() - start)
+
+
+def format_row(result: dict) -> str:
+    cells = [f"c={result['concurrency']:<4}", f"{result['throughput_rps']:8.1f} rps", f"err {result['error_rate'] * 100:5.1f}%",
+             f"502 {result['provider_errors']:<5}", f"404 {result['not_found']:<5}"]
+    for op, s in result["ops"].items():
+        cells.append(f"{op}: p50 {s['p50_ms']:7.0f} p95 {s['p95_ms']:7.0f} p99 {s['p99_ms']:7.0f} ms")
+    return "  ".join(cells)
+
+
+async def run(args: argparse.Namespace) -> List[dict]:
+    videos = [f"loadvid{i:04d}" for i in range(args.videos)]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        runner = LoadRunner(client, videos, parse_mix(args.mix), args.questions_per_video)
+        await runner.warm_up(args.warm_videos)
+        results = []
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            result = await runner.run_level(concurrency, args.duration)
+            print(format_row(result), flush=True)
+            if result["not_found"]:
+                print(f"warning: {result['not_found']} requests got 404 (video not ingested on the answering worker); "
+                      "multi-worker backends need sticky routing or per-worker ingest", file=sys.stderr, flush=True)
+            results.append(result)
+        return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per concurrency level")
+    parser.add_argument("--mix", default="query=0.9,ingest=0.1")
+    parser.add_argument("--videos", type=int, default=50, help="size of the video id pool")
+    parser.add_argument("--warm-videos", type=int, default=5, help="videos ingested before measuring")
+    parser.add_argument("--questions-per-video", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", default=None, help="write per-level results to this file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# backend/loadtest/stub_provider.py
+"""
+Offline stand-in for the Gemini REST API (and YouTube transcripts) for load testing.
+
+Serves the endpoints the google.generativeai REST transport calls:
+  POST /v1beta/models/{model}:embedContent
+  POST /v1beta/models/{model}:batchEmbedContents
+  POST /v1beta/models/{model}:generateContent
+  POST /v1beta/models/{model}:streamGenerateContent   (?alt=sse for server-sent events)
+plus GET /transcripts/{video_id} for TRANSCRIPT_STUB_URL.
+
+Run it, then point the backend at it:
+  python -m loadtest.stub_provider --port 9000 --generate-latency lognormal:800,0.5 --error-rate 0.01
+  GOOGLE_API_KEY=local GEMINI_API_ENDPOINT=http://127.0.0.1:9000 \\
+      TRANSCRIPT_STUB_URL=http://127.0.0.1:9000 uvicorn app.main:app --port 8000
+
+Latency specs (milliseconds): fixed:MS, uniform:LO,HI, exp:MEAN, lognormal:MEDIAN,SIGMA
+"""
+from typing import Callable, List, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Turn a latency spec into a sampler returning seconds."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0] / 1000.0
+    if kind == "uniform":
+        lo, hi = values
+        return lambda: random.uniform(lo, hi) / 1000.0
+    if kind == "exp":
+        mean = values[0]
+        return lambda: random.expovariate(1.0 / mean) / 1000.0 if mean > 0 else 0.0
+    if kind == "lognormal":
+        median, sigma = values
+        mu = math.log(median)
+        return lambda: random.lognormvariate(mu, sigma) / 1000.0
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class StubConfig:
+    def __init__(
+        self,
+        embed_latency: str = "fixed:0",
+        generate_latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        embed_dim: int = 768,
+        stream_chunks: int = 8,
+        stream_interval: str = "fixed:0",
+        transcript_chars: int = 20000,
+        seed: Optional[int] = None,
+    ):
+        self.embed_latency = parse_latency(embed_latency)
+        self.generate_latency = parse_latency(generate_latency)
+        self.stream_interval = parse_latency(stream_interval)
+        self.error_rate = error_rate
+        self.embed_dim = embed_dim
+        self.stream_chunks = stream_chunks
+        self.transcript_chars = transcript_chars
+        if seed is not None:
+            random.seed(seed)
+
+
+WORDS = (
+    "reactor plasma fusion energy magnet tokamak neutron lecture model data network training "
+    "gradient loss function camera scene light history empire trade river city music rhythm"
+).split()
+
+
+def _embedding(text: str, dim: int) -> List[float]:
+    # deterministic per text so repeated chunks embed identically
+    rng = random.Random(hashlib.sha1(text.encode("utf-8")).digest())
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _content_text(body: dict) -> str:
+    content = body.get("content") or {}
+    parts = content.get("parts") or []
+    if not parts and body.get("contents"):
+        parts = body["contents"][-1].get("parts") or []
+    return " ".join(p.get("text", "") for p in parts)
+
+
+def _answer_for(prompt: str) -> str:
+    question = prompt.split("QUESTION:")[-1].split("Answer:")[0].strip()
+    return f"Stand-in answer to: {question[:200]}"
+
+
+def _candidate(text: str, finish: Optional[str] = "STOP") -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = finish
+    return candidate
+
+
+def _error() -> JSONResponse:
+    code = random.choice([429, 500, 503])
+    status = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}[code]
+    return JSONResponse(status_code=code, content={"error": {"code": code, "message": "injected stand-in error", "status": status}})
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="VidSage provider stand-in")
+
+    @app.post("/v1beta/models/{model_action}")
+    async def model_action(model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        body = await request.json()
+
+        if random.random() < config.error_rate:
+            return _error()
+
+        if action == "embedContent":
+            await asyncio.sleep(config.embed_latency())
+            return {"embedding": {"values": _embedding(_content_text(body), config.embed_dim)}}
+
+        if action == "batchEmbedContents":
+            await asyncio.sleep(config.embed_latency())
+            requests_ = body.get("requests") or []
+            return {"embeddings": [{"values": _embedding(_content_text(r), config.embed_dim)} for r in requests_]}
+
+        if action == "generateContent":
+            await asyncio.sleep(config.generate_latency())
+            text = _answer_for(_content_text(body))
+            return {
+                "candidates": [_candidate(text)],
+                "usageMetadata": {"promptTokenCount": len(_content_text(body)) // 4, "candidatesTokenCount": len(text) // 4},
+            }
+
+        if action == "streamGenerateContent":
+            text = _answer_for(_content_text(body))
+            sse = request.query_params.get("alt") == "sse"
+            return StreamingResponse(_stream(text, sse), media_type="text/event-stream" if sse else "application/json")
+
+        return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"Unknown action {action} for {model}", "status": "NOT_FOUND"}})
+
+    async def _stream(text: str, sse: bool):
+        # time to first token follows the generate latency, then chunks arrive at stream_interval
+        await asyncio.sleep(config.generate_latency())
+        n = max(1, config.stream_chunks)
+        step = max(1, math.ceil(len(text) / n))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        if not sse:
+            yield "["
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            payload = json.dumps({"candidates": [_candidate(piece, "STOP" if last else None)]})
+            if sse:
+                yield f"data: {payload}\r\n\r\n"
+            else:
+                yield payload + ("" if last else ",")
+            if not last:
+                await asyncio.sleep(config.stream_interval())
+        if not sse:
+            yield "]"
+
+    @app.get("/transcripts/{video_id}")
+    async def transcript(video_id: str):
+        rng = random.Random(video_id)
+        segments, total, start = [], 0, 0.0
+        while total < config.transcript_chars:
+            text = " ".join(rng.choice(WORDS) for _ in range(12))
+            segments.append({"text": text, "start": start, "duration": 4.0})
+            total += len(text) + 1
+            start += 4.0
+        return segments
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--embed-latency", default="lognormal:60,0.4")
+    parser.add_argument("--generate-latency", default="lognormal:900,0.5")
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--stream-interval", default="fixed:40")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429/500/503")
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--transcript-chars", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        embed_latency=args.embed_latency,
+        generate_latency=args.generate_latency,
+        error_rate=args.error_rate,
+        embed_dim=args.embed_dim,
+        stream_chunks=args.stream_chunks,
+        stream_interval=args.stream_interval,
+        transcript_chars=args.transcript_chars,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
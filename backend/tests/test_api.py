@@ -49,3 +49,50 @@ def test_ingest_and_query_flow(monkeypatch):
     data = qresp.json()
     assert "answer" in data
     assert "fusion" in data["answer"].lower() or data["answer"].lower() == "i don't know."
+
+
+def test_prefetch_is_reused_by_ingest(monkeypatch):
+    calls = []
+
+    def fake_fetch(video_id, languages=None):
+        calls.append(video_id)
+        return "This transcript mentions nuclear fusion and experimental reactors."
+
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", fake_fetch)
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", FakeEmb())
+    from app import services
+    services.rag.INDEXES.clear()
+
+    client = TestClient(main_mod.app)
+
+    video_id = "test_vid_prefetch_1"
+    presp = client.post(f"/prefetch/{video_id}")
+    assert presp.status_code == 202, presp.text
+    assert presp.json()["state"] in ("queued", "running", "done")
+
+    # a duplicate prefetch does not schedule a second job
+    assert client.post(f"/prefetch/{video_id}").status_code == 202
+
+    # ingest either waits for the running prefetch or takes over a queued one
+    resp = client.post(f"/ingest/{video_id}")
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["chunks"] > 0
+    assert calls == [video_id]
+    assert video_id in services.rag.INDEXES
+
+
+def test_provider_failure_is_a_502(monkeypatch):
+    from app.deps import ProviderError
+
+    class FailingLLM:
+        def generate(self, prompt: str) -> str:
+            raise ProviderError("upstream 503")
+
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: "a transcript")
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", FakeEmb())
+    monkeypatch.setattr(main_mod, "LLM_PROVIDER", FailingLLM())
+
+    client = TestClient(main_mod.app)
+    assert client.post("/ingest/test_vid_provider_err").status_code == 200
+    resp = client.post("/query", json={"session_id": "s", "video_id": "test_vid_provider_err", "question": "q"})
+    assert resp.status_code == 502
@@ -0,0 +1,120 @@
+import json
+import os
+import numpy as np
+import pytest
+from app.services import rag, bundles
+
+
+class KeywordEmbeddings:
+    model_name = "test-keyword-emb"
+    WORDS = ["fusion", "reactor", "cooking", "pasta", "music", "guitar", "plasma", "sauce"]
+
+    def embed_documents(self, texts):
+        out = []
+        for t in texts:
+            vec = [float(t.lower().count(w)) + 0.01 for w in self.WORDS]
+            norm = sum(v * v for v in vec) ** 0.5
+            out.append([v / norm for v in vec])
+        return out
+
+
+class OtherEmbeddings(KeywordEmbeddings):
+    model_name = "some-other-model"
+
+
+class NarrowEmbeddings(KeywordEmbeddings):
+    # same name, but configured with fewer dimensions
+    WORDS = KeywordEmbeddings.WORDS[:4]
+
+
+class UnnamedEmbeddings(KeywordEmbeddings):
+    model_name = None
+
+
+class CountingEmbeddings(KeywordEmbeddings):
+    def __init__(self):
+        self.queries = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self.embed_documents([text])[0]
+
+
+def _build(video_id, text, emb):
+    scratch = {}
+    rag.ingest_video_to_index(video_id, text, emb, scratch)
+    vectors, docs = bundles.export_faiss(scratch[video_id])
+    segments = [{"text": text, "start": 12.5}]
+    return video_id, vectors, [d.page_content for d in docs], bundles.chunk_timestamps(docs, segments)
+
+
+def test_bundle_roundtrip_is_mapped_and_searchable(tmp_path):
+    emb = KeywordEmbeddings()
+    fusion = "fusion reactor plasma " * 200 + "cooking pasta sauce " * 200
+    music = "music guitar " * 300
+    path = str(tmp_path / "shard")
+    manifest = bundles.write_bundle(path, emb.model_name, [_build("vid_a", fusion, emb), _build("vid_b", music, emb)])
+    assert manifest["dim"] == len(KeywordEmbeddings.WORDS)
+    assert [v["video_id"] for v in manifest["videos"]] == ["vid_a", "vid_b"]
+
+    indexes_map = {}
+    loaded = bundles.load_bundle(path, emb, indexes_map)
+    assert loaded == ["vid_a", "vid_b"]
+    index = indexes_map["vid_a"]
+    assert isinstance(index.vectors, np.memmap)
+    assert len(index) == manifest["videos"][0]["count"]
+
+    docs = rag.retrieve_docs_for_question("vid_a", "pasta sauce cooking", indexes_map, k=2)
+    assert len(docs) == 2
+    assert "pasta" in docs[0].page_content
+    assert docs[0].metadata["start"] == 12.5
+
+    docs_b = rag.retrieve_docs_for_question("vid_b", "guitar", indexes_map, k=1)
+    assert "guitar" in docs_b[0].page_content
+
+
+def test_bundle_from_other_model_is_refused(tmp_path):
+    emb = KeywordEmbeddings()
+    path = str(tmp_path / "vid_a")
+    bundles.write_bundle(path, emb.model_name, [_build("vid_a", "fusion reactor " * 300, emb)])
+
+    indexes_map = {}
+    with pytest.raises(bundles.BundleModelMismatch):
+        bundles.load_bundle(path, OtherEmbeddings(), indexes_map)
+    assert indexes_map == {}
+
+
+def test_bundle_with_other_dimension_or_unnamed_provider_is_refused(tmp_path):
+    emb = KeywordEmbeddings()
+    path = str(tmp_path / "vid_a")
+    bundles.write_bundle(path, emb.model_name, [_build("vid_a", "fusion reactor " * 300, emb)])
+
+    indexes_map = {}
+    with pytest.raises(bundles.BundleModelMismatch, match="dimension"):
+        bundles.load_bundle(path, NarrowEmbeddings(), indexes_map)
+    with pytest.raises(bundles.BundleModelMismatch, match="model_name"):
+        bundles.load_bundle(path, UnnamedEmbeddings(), indexes_map)
+    assert indexes_map == {}
+
+
+def test_bundle_dir_probes_the_provider_once(tmp_path):
+    emb = KeywordEmbeddings()
+    for video_id in ("vid_a", "vid_b", "vid_c"):
+        bundles.write_bundle(str(tmp_path / video_id), emb.model_name, [_build(video_id, "fusion reactor " * 300, emb)])
+
+    counting = CountingEmbeddings()
+    loaded = bundles.load_bundle_dir(str(tmp_path), counting, {})
+    assert loaded == ["vid_a", "vid_b", "vid_c"]
+    assert counting.queries == 1
+
+
+def test_manifest_with_out_of_range_video_is_refused(tmp_path):
+    emb = KeywordEmbeddings()
+    path = str(tmp_path / "vid_a")
+    manifest = bundles.write_bundle(path, emb.model_name, [_build("vid_a", "fusion reactor " * 300, emb)])
+    manifest["videos"][0]["count"] = manifest["count"] + 5
+    with open(os.path.join(path, bundles.MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    with pytest.raises(bundles.BundleError, match="rows"):
+        bundles.load_bundle(path, emb, {})
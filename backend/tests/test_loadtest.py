@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+from loadtest import stub_provider, loadgen
+
+
+def test_stub_embed_and_generate_shapes():
+    client = TestClient(stub_provider.create_app(stub_provider.StubConfig(embed_dim=16)))
+
+    resp = client.post("/v1beta/models/text-embedding-004:embedContent", json={"content": {"parts": [{"text": "hello"}]}})
+    assert resp.status_code == 200
+    values = resp.json()["embedding"]["values"]
+    assert len(values) == 16
+    # deterministic per text
+    again = client.post("/v1beta/models/text-embedding-004:embedContent", json={"content": {"parts": [{"text": "hello"}]}})
+    assert again.json()["embedding"]["values"] == values
+
+    prompt = "CONTEXT:\nstuff\n\nQUESTION:\nWas fusion discussed?\n\nAnswer:"
+    gen = client.post("/v1beta/models/gemini-2.0-flash:generateContent", json={"contents": [{"parts": [{"text": prompt}]}]})
+    assert gen.status_code == 200
+    assert "fusion" in gen.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def test_stub_streams_and_injects_errors():
+    client = TestClient(stub_provider.create_app(stub_provider.StubConfig(stream_chunks=4)))
+    resp = client.post("/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse", json={"contents": [{"parts": [{"text": "QUESTION: hi"}]}]})
+    events = [line for line in resp.text.splitlines() if line.startswith("data: ")]
+    assert 1 < len(events) <= 4
+
+    failing = TestClient(stub_provider.create_app(stub_provider.StubConfig(error_rate=1.0)))
+    resp = failing.post("/v1beta/models/gemini-2.0-flash:generateContent", json={"contents": []})
+    assert resp.status_code in (429, 500, 503)
+
+
+def test_percentile_and_mix():
+    assert loadgen.percentile([0.1 * i for i in range(1, 101)], 99) == 0.1 * 99
+    assert loadgen.percentile([], 50) == 0.0
+    assert loadgen.parse_mix("query=0.9,ingest=0.1") == {"query": 0.9, "ingest": 0.1}
+
+
+def test_stats_report_not_found_separately_from_errors():
+    stats = loadgen.Stats()
+    stats.record("query", 0.1, 200)
+    stats.record("query", 0.1, 404)
+    stats.record("query", 0.1, 502)
+    summary = stats.summary(1, 1.0)
+    assert summary["not_found"] == 1
+    assert summary["provider_errors"] == 1
+    # 404s are excluded from the error rate: one error out of ok + errors
+    assert summary["error_rate"] == 0.5
+    assert summary["ops"]["query"]["not_found"] == 1
@@ -0,0 +1,134 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+import app.main as main_mod
+from app.services import memory, prefetch, rag
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+class WideEmb:
+    # realistic embedding width so vector storage dominates index size
+    def embed_documents(self, texts):
+        return [[0.1] * 768 for _ in texts]
+
+
+def _long_transcript(video_id: str) -> str:
+    # ~400k characters -> ~500 chunks, roughly 2 MB once indexed
+    return (f"{video_id} lecture segment about reactors and plasma. " * 8000)
+
+
+def test_estimate_index_counts_vectors_and_text():
+    indexes_map = {}
+    rag.ingest_video_to_index("vid_mem_1", "word " * 1500, WideEmb(), indexes_map)
+    nbytes, chunks = memory.estimate_index(indexes_map["vid_mem_1"])
+    assert chunks > 0
+    assert nbytes >= chunks * 768 * 4
+
+
+def test_ingest_past_budget_evicts_and_bounds_rss(monkeypatch):
+    budget = 8 * 1024 * 1024
+    monkeypatch.setattr(memory, "MEMORY_BUDGET_BYTES", budget)
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN["X-Admin-Token"])
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: _long_transcript(video_id))
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", WideEmb())
+    rag.INDEXES.clear()
+
+    client = TestClient(main_mod.app)
+
+    # warm up allocator and imports before taking the baseline
+    for i in range(3):
+        assert client.post(f"/ingest/warm_{i}").status_code == 200
+    baseline = memory.current_rss_bytes()
+
+    # unbounded, 40 of these would hold ~80 MB of indexes
+    for i in range(40):
+        resp = client.post(f"/ingest/big_{i}")
+        assert resp.status_code == 200, resp.text
+
+        stats = client.get("/admin/memory", headers=ADMIN).json()
+        assert stats["used_bytes"] <= budget
+
+    # the most recent video is kept, the oldest were evicted
+    assert "big_39" in rag.INDEXES
+    assert "warm_0" not in rag.INDEXES
+    assert memory.current_rss_bytes() - baseline < 40 * 1024 * 1024
+
+
+def test_ingest_larger_than_budget_is_rejected(monkeypatch):
+    monkeypatch.setattr(memory, "MEMORY_BUDGET_BYTES", 64 * 1024)
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: _long_transcript(video_id))
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", WideEmb())
+    rag.INDEXES.clear()
+
+    client = TestClient(main_mod.app)
+    resp = client.post("/ingest/too_big")
+    assert resp.status_code == 503
+    assert "Retry-After" in resp.headers
+    assert "too_big" not in rag.INDEXES
+
+
+def test_admin_routes_are_off_without_a_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    client = TestClient(main_mod.app)
+    assert client.get("/admin/memory").status_code == 404
+    assert client.post("/admin/bundles", json={"path": "/tmp"}).status_code == 404
+
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN["X-Admin-Token"])
+    assert client.get("/admin/memory").status_code == 403
+    assert client.get("/admin/memory", headers=ADMIN).status_code == 200
+
+
+def test_cold_sessions_are_evicted_before_rejecting(monkeypatch):
+    monkeypatch.setattr(memory, "MEMORY_BUDGET_BYTES", 200_000)
+    sessions_map = {
+        f"s{i}": [{"role": "user", "text": "x" * 10_000, "ts": 1000 + i}]
+        for i in range(19)
+    }
+    token = memory.reserve("vid_sessions", 50_000, {}, sessions_map)
+    memory.release(token)
+    # the oldest sessions went first, the most recent ones survive
+    assert "s0" not in sessions_map
+    assert "s18" in sessions_map
+
+
+def test_fresh_ingest_is_not_the_first_eviction(monkeypatch):
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: _long_transcript(video_id))
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", WideEmb())
+    rag.INDEXES.clear()
+    client = TestClient(main_mod.app)
+
+    assert client.post("/ingest/lru_a").status_code == 200
+    assert client.post("/ingest/lru_b").status_code == 200
+    # re-ingesting a replaces its index and makes it the most recently used
+    assert client.post("/ingest/lru_a").status_code == 200
+
+    stats = {s["video_id"]: s for s in memory.index_stats(rag.INDEXES)}
+    assert stats["lru_a"]["last_access"] >= stats["lru_b"]["last_access"]
+
+
+def test_interactive_ingest_preempts_a_prefetch_holding_budget(monkeypatch):
+    mb = 1024 * 1024
+    monkeypatch.setattr(memory, "MEMORY_BUDGET_BYTES", 10 * mb)
+    reserved = threading.Event()
+
+    def build(video_id, text, indexes, cancel_check=None):
+        # a long stream: holds most of the budget and keeps embedding until cancelled
+        token = memory.reserve(video_id, 8 * mb, {}, {}, evict=False, speculative=True)
+        try:
+            reserved.set()
+            while True:
+                cancel_check()
+                time.sleep(0.01)
+        finally:
+            memory.release(token)
+
+    prefetch.schedule("vid_long_stream", lambda v: "stream", build, {})
+    job = prefetch._jobs["vid_long_stream"]
+    assert reserved.wait(5)
+
+    token = memory.reserve("vid_user", 3 * mb, {}, {}, evict=True)
+    memory.release(token)
+    assert job.finished.wait(5)
+    assert job.state == prefetch.CANCELLED
@@ -0,0 +1,131 @@
+import threading
+from app.services import prefetch, rag
+
+
+class GatedEmbeddings:
+    """Blocks inside the first embedding batch until the test lets it continue."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.go = threading.Event()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.started.set()
+        self.go.wait(5)
+        return [[0.1] * 8 for _ in texts]
+
+
+def _builder(emb):
+    def build(video_id, text, indexes, cancel_check=None):
+        return rag.ingest_video_to_index(video_id, text, emb, indexes, cancel_check=cancel_check)
+    return build
+
+
+def test_cancel_stops_embedding_between_batches():
+    emb = GatedEmbeddings()
+    indexes_map = {}
+    video_id = "vid_prefetch_cancel"
+    # enough text for several embedding batches
+    prefetch.schedule(video_id, lambda v: "word " * 40000, _builder(emb), indexes_map)
+    job = prefetch._jobs[video_id]
+
+    assert emb.started.wait(5)
+    assert prefetch.cancel(video_id)
+    emb.go.set()
+
+    assert job.finished.wait(5)
+    assert job.state == prefetch.CANCELLED
+    assert emb.calls == 1
+    assert video_id not in indexes_map
+
+
+def test_cancelled_job_does_not_wait_out_interactive_traffic():
+    emb = GatedEmbeddings()
+    emb.go.set()
+    indexes_map = {}
+    video_id = "vid_prefetch_yield"
+    with prefetch.interactive():
+        prefetch.schedule(video_id, lambda v: "word " * 500, _builder(emb), indexes_map)
+        job = prefetch._jobs[video_id]
+        prefetch.cancel(video_id)
+        # well under MAX_YIELD_SECONDS
+        assert job.finished.wait(2)
+    assert job.state == prefetch.CANCELLED
+    assert emb.calls == 0
+
+
+def test_finished_job_is_dropped_but_still_claimable():
+    emb = GatedEmbeddings()
+    emb.go.set()
+    indexes_map = {}
+    video_id = "vid_prefetch_done"
+    fetched = threading.Event()
+    prefetch.schedule(video_id, lambda v: fetched.wait(5) and "word " * 500, _builder(emb), indexes_map)
+    job = prefetch._jobs[video_id]
+    fetched.set()
+
+    assert job.finished.wait(5)
+    assert job.state == prefetch.DONE
+    assert video_id not in prefetch._jobs
+    assert video_id in indexes_map
+    assert prefetch.claim(video_id, indexes_map) == job.chunks
+    # claimed once; the record is gone afterwards
+    assert video_id not in prefetch._done
+
+
+def test_embedding_batches_yield_to_interactive_requests():
+    indexes_map = {}
+    video_id = "vid_prefetch_batches"
+    first_batch = threading.Event()
+    release_first = threading.Event()
+    batches = []
+
+    class RecordingEmbeddings:
+        def embed_documents(self, texts):
+            batches.append(prefetch._interactive_count)
+            if len(batches) == 1:
+                first_batch.set()
+                release_first.wait(5)
+            return [[0.1] * 8 for _ in texts]
+
+    prefetch.schedule(video_id, lambda v: "word " * 40000, _builder(RecordingEmbeddings()), indexes_map)
+    job = prefetch._jobs[video_id]
+    assert first_batch.wait(5)
+
+    with prefetch.interactive():
+        release_first.set()
+        # the job finishes its current batch, then waits at the next checkpoint
+        job.finished.wait(0.3)
+        assert len(batches) == 1
+    assert job.finished.wait(10)
+
+    assert job.state == prefetch.DONE
+    assert len(batches) > 2
+    # no batch started while an interactive request was in flight
+    assert batches.count(0) == len(batches)
+
+
+def test_claimed_job_survives_last_requester_leaving():
+    emb = GatedEmbeddings()
+    indexes_map = {}
+    video_id = "vid_prefetch_claimed"
+    prefetch.schedule(video_id, lambda v: "word " * 500, _builder(emb), indexes_map)
+    job = prefetch._jobs[video_id]
+    assert emb.started.wait(5)
+
+    claimed = []
+    waiter = threading.Thread(target=lambda: claimed.append(prefetch.claim(video_id, indexes_map, timeout=5)))
+    waiter.start()
+    while not job.claimed:
+        waiter.join(0.01)
+
+    # the tab that scheduled the prefetch goes away while /ingest is waiting on it
+    assert not prefetch.cancel(video_id)
+    emb.go.set()
+    waiter.join(5)
+
+    assert job.state == prefetch.DONE
+    assert claimed == [job.chunks]
+    assert emb.calls == 1
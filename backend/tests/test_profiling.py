@@ -0,0 +1,123 @@
+import time
+from fastapi.testclient import TestClient
+import app.main as main_mod
+from app.services import profiling
+
+
+def _busy_wait_for_profiler(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def test_sampled_request_produces_collapsed_stacks_and_stage_timings():
+    profiling.reset()
+    with profiling.request_trace("unit", "vid_prof_1", profile="sample") as trace:
+        with profiling.stage("busy"):
+            _busy_wait_for_profiler(0.1)
+
+    profile = profiling.get_profile(trace["profile_id"])
+    assert profile is not None
+    lines = profile["output"].splitlines()
+    assert lines
+    # collapsed format: "frame;frame;frame count"
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("_busy_wait_for_profiler" in line for line in lines)
+
+    traces = profiling.slowest_traces()
+    assert traces[0]["stages"][0]["stage"] == "busy"
+    assert traces[0]["stages"][0]["ms"] >= 100
+
+
+def test_cprofile_falls_back_to_sampler_when_process_wide(monkeypatch):
+    # Python 3.12+: cProfile would see every thread, so the per-thread sampler is used
+    monkeypatch.setattr(profiling, "CPROFILE_PER_THREAD", False)
+    profiling.reset()
+    with profiling.request_trace("unit", "vid_prof_2", profile="cprofile") as trace:
+        _busy_wait_for_profiler(0.05)
+
+    profile = profiling.get_profile(trace["profile_id"])
+    assert profile["mode"] == "sample"
+    assert any("_busy_wait_for_profiler" in line for line in profile["output"].splitlines())
+
+
+def test_slowest_traces_are_bounded_and_sorted(monkeypatch):
+    profiling.reset()
+    monkeypatch.setattr(profiling, "SLOW_TRACES_KEPT", 3)
+    for i, delay in enumerate([0.0, 0.03, 0.01, 0.05, 0.02]):
+        with profiling.request_trace("unit", f"vid_{i}"):
+            time.sleep(delay)
+
+    traces = profiling.slowest_traces()
+    assert [t["video_id"] for t in traces] == ["vid_3", "vid_1", "vid_4"]
+    # unprofiled requests store no profile
+    assert all(t["profile_id"] is None for t in traces)
+
+
+def test_profile_header_on_query(monkeypatch):
+    class FakeEmb:
+        def embed_documents(self, texts):
+            return [[0.1] * 8 for _ in texts]
+
+    class FakeLLM:
+        def generate(self, prompt: str) -> str:
+            _busy_wait_for_profiler(0.1)
+            return "I don't know."
+
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: "a short transcript about fusion")
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", FakeEmb())
+    monkeypatch.setattr(main_mod, "LLM_PROVIDER", FakeLLM())
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    admin = {"X-Admin-Token": "test-admin-token"}
+    profiling.reset()
+
+    client = TestClient(main_mod.app)
+    assert client.post("/ingest/vid_prof_api").status_code == 200
+
+    payload = {"session_id": "s1", "video_id": "vid_prof_api", "question": "fusion?"}
+    resp = client.post("/query", json=payload, headers={"X-Profile": "cprofile", **admin})
+    assert resp.status_code == 200, resp.text
+    profile_id = resp.headers["X-Profile-Id"]
+
+    presp = client.get(f"/admin/profiles/{profile_id}", headers=admin)
+    assert presp.status_code == 200
+    listed = {p["id"]: p for p in client.get("/admin/profiles", headers=admin).json()["profiles"]}
+    assert listed[profile_id]["mode"] == ("cprofile" if profiling.CPROFILE_PER_THREAD else "sample")
+    assert "answer_question" in presp.text
+
+    stages = [s["stage"] for t in client.get("/admin/traces", headers=admin).json()["traces"] if t["endpoint"] == "query" for s in t["stages"]]
+    assert {"retrieve", "build_prompt", "llm"} <= set(stages)
+
+    # no header: no profile id
+    assert "X-Profile-Id" not in client.post("/query", json=payload).headers
+
+
+def test_profile_header_is_ignored_when_admin_is_off(monkeypatch):
+    class FakeEmb:
+        def embed_documents(self, texts):
+            return [[0.1] * 8 for _ in texts]
+
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", lambda video_id, languages=None: "a short transcript about fusion")
+    monkeypatch.setattr(main_mod, "EMB_PROVIDER", FakeEmb())
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+
+    resp = TestClient(main_mod.app).post("/ingest/vid_prof_noadmin", headers={"X-Profile": "sample"})
+    assert resp.status_code == 200, resp.text
+    assert "X-Profile-Id" not in resp.headers
+
+
+def test_failed_request_still_returns_profile_id(monkeypatch):
+    def no_transcript(video_id, languages=None):
+        raise RuntimeError("captions disabled")
+
+    monkeypatch.setattr(main_mod.transcript, "fetch_transcript_text", no_transcript)
+    monkeypatch.setenv("ADMIN_TOKEN", "test-admin-token")
+    admin = {"X-Admin-Token": "test-admin-token"}
+    profiling.reset()
+
+    client = TestClient(main_mod.app)
+    resp = client.post("/ingest/vid_prof_fail", headers={"X-Profile": "sample", **admin})
+    assert resp.status_code == 404
+    profile_id = resp.headers["X-Profile-Id"]
+    assert client.get(f"/admin/profiles/{profile_id}", headers=admin).status_code == 200
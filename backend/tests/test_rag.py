@@ -28,3 +28,73 @@ def test_ingest_and_retrieve(tmp_path):
     assert len(docs) <= 2
     # each doc should be a langchain Document-like object with .page_content
     assert hasattr(docs[0], "page_content")
+
+
+def test_mmr_select_skips_near_duplicates_and_keeps_diverse_chunks():
+    import numpy as np
+    query = np.array([1.0, 0.2, 0.0, 0.0])
+    cands = np.array([
+        [1.0, 0.0, 0.0, 0.0],    # best match
+        [1.0, -0.01, 0.0, 0.0],  # near-duplicate of 0
+        [0.9, 0.4, 0.0, 0.0],    # relevant, different
+        [0.99, 0.0, 0.01, 0.0],  # another near-duplicate of 0
+        [0.0, 0.0, 1.0, 0.0],    # off-topic
+    ])
+    picked = rag.mmr_select(query, cands, k=4, lambda_mult=0.5)
+    assert picked[0] == 0
+    assert 2 in picked
+    assert 1 not in picked and 3 not in picked
+    # the off-topic candidate sits behind a large relevance gap and is never used to fill k
+    assert 4 not in picked
+
+
+def test_mmr_select_lambda_one_is_plain_relevance_order():
+    import numpy as np
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=16)
+    cands = rng.normal(size=(10, 16))
+    picked = rag.mmr_select(query, cands, k=3, lambda_mult=1.0, score_gap=10.0, duplicate_threshold=1.01)
+    cos = (cands / np.linalg.norm(cands, axis=1, keepdims=True)) @ (query / np.linalg.norm(query))
+    assert picked == [int(i) for i in np.argsort(-cos)[:3]]
+
+
+def test_mmr_select_is_sub_millisecond():
+    import time
+    import numpy as np
+    rng = np.random.default_rng(1)
+    query = rng.normal(size=768).astype(np.float32)
+    cands = rng.normal(size=(rag.MMR_FETCH_K, 768)).astype(np.float32)
+    rag.mmr_select(query, cands, k=4)
+    timings = []
+    for _ in range(200):
+        start = time.perf_counter()
+        rag.mmr_select(query, cands, k=4)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    assert timings[len(timings) // 2] < 0.001
+
+
+def test_reranked_retrieval_drops_repeated_chunks():
+    class KeywordEmbeddings:
+        WORDS = ["fusion", "reactor", "plasma", "magnet", "budget", "timeline"]
+
+        def embed_documents(self, texts: List[str]):
+            out = []
+            for t in texts:
+                vec = [float(t.lower().count(w)) + 0.01 for w in self.WORDS]
+                norm = sum(v * v for v in vec) ** 0.5
+                out.append([v / norm for v in vec])
+            return out
+
+    # a repetitive lecture: the same fusion explanation many times, then one budget remark
+    text = "fusion reactor plasma " * 400 + "the magnet budget and timeline " * 40
+    indexes_map = {}
+    rag.ingest_video_to_index("vid_rep", text, KeywordEmbeddings(), indexes_map)
+
+    plain = rag.retrieve_docs_for_question("vid_rep", "fusion reactor plasma budget", indexes_map, k=4, rerank=False)
+    reranked = rag.retrieve_docs_for_question("vid_rep", "fusion reactor plasma budget", indexes_map, k=4, rerank=True)
+    assert len(plain) == 4
+    assert 0 < len(reranked) <= 4
+    assert len({d.page_content for d in reranked}) == len(reranked)
+    # plain top-k is dominated by identical fusion chunks; re-ranking keeps at most one of them
+    assert sum("budget" not in d.page_content for d in reranked) <= 1
@@ -1,3 +1,25 @@
+const API_BASE = 'http://localhost:8000';
+
+// tabId -> videoId currently being prefetched for that tab
+const tabPrefetches = new Map();
+
+function cancelPrefetch(tabId) {
+  const videoId = tabPrefetches.get(tabId);
+  if (!videoId) return;
+  tabPrefetches.delete(tabId);
+  fetch(`${API_BASE}/prefetch/${videoId}`, { method: 'DELETE' })
+    .catch((error) => console.log('Prefetch cancel failed:', error));
+}
+
+function startPrefetch(tabId, videoId) {
+  if (tabPrefetches.get(tabId) === videoId) return;
+  cancelPrefetch(tabId);
+  if (!videoId) return;
+  tabPrefetches.set(tabId, videoId);
+  fetch(`${API_BASE}/prefetch/${videoId}`, { method: 'POST' })
+    .catch((error) => console.log('Prefetch request failed:', error));
+}
+
 chrome.action.onClicked.addListener((tab) => {
   // Get video ID from current YouTube tab if available
   let videoId = null;
@@ -36,6 +58,14 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
       // Return true to indicate we will respond asynchronously
       return true;
     }
+    
+    if (request.action === 'prefetchVideo') {
+      if (sender.tab) {
+        startPrefetch(sender.tab.id, request.videoId);
+      }
+      sendResponse({ success: true });
+      return false;
+    }
   } catch (error) {
     console.error('Error in message listener:', error);
     sendResponse({ success: false, error: error.message });
@@ -49,6 +79,14 @@ chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
   if (changeInfo.status === 'complete' && tab.url && tab.url.includes('youtube.com/watch')) {
     // Service worker stays active when YouTube tabs are being watched
   }
+  // Tab navigated away from YouTube videos entirely - drop its prefetch
+  if (changeInfo.url && !changeInfo.url.includes('youtube.com/watch')) {
+    cancelPrefetch(tabId);
+  }
+});
+
+chrome.tabs.onRemoved.addListener((tabId) => {
+  cancelPrefetch(tabId);
 });
 
 // Handle startup to ensure service worker is ready
@@ -135,6 +135,27 @@
     }
   }
   
+  // Tell the background worker which video this tab is on so it can start ingest early.
+  // A null videoId means the tab left the video and any pending prefetch can be dropped.
+  let lastPrefetchVideoId;
+  function notifyVideoChanged() {
+    const videoId = new URLSearchParams(window.location.search).get('v');
+    if (videoId === lastPrefetchVideoId) return;
+    lastPrefetchVideoId = videoId;
+    
+    try {
+      if (chrome.runtime && chrome.runtime.id) {
+        chrome.runtime.sendMessage({ action: 'prefetchVideo', videoId: videoId }, () => {
+          if (chrome.runtime.lastError) {
+            console.log('Prefetch message failed:', chrome.runtime.lastError.message);
+          }
+        });
+      }
+    } catch (error) {
+      console.log('Could not request prefetch:', error);
+    }
+  }
+  
   // Function to check and reinject button if needed
   function checkAndReinjectButton() {
     const videoId = new URLSearchParams(window.location.search).get('v');
@@ -145,6 +166,7 @@
   
   // Run when page loads
   addVidSageButton();
+  notifyVideoChanged();
   
   // Clean up any existing observers before creating new ones
   if (window.vidSageObserver) {
@@ -156,6 +178,7 @@
   const observer = new MutationObserver(() => {
     if (location.href !== currentUrl) {
       currentUrl = location.href;
+      notifyVideoChanged();
       // Remove existing button first
       const existingButton = document.querySelector('#vidsage-button');
       if (existingButton) {